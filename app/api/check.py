@@ -1,8 +1,56 @@
 import os
 import json
-from flask import request, jsonify
-from app.checks import run_checks
+from flask import Response, request, jsonify, stream_with_context
+from app.checks import run_checks, run_checks_stream
 from app.api.log_praser import parse_check_log
+from app.api.sse import sse
+from app.checks.llm_based import cache as llm_cache
+from app.services.page_store import PageStore
+
+
+def _read_check_request():
+    """Validate a check request body.
+
+    Returns:
+        (run_checks keyword arguments, parse_check_log context, None), or
+        (None, None, error response)
+    """
+    data = request.get_json()
+    if not data or "text" not in data:
+        return None, None, (jsonify({"error": "Missing 'text' field"}), 400)
+    
+    text = data["text"]
+    filename = data.get("filename", "unknown")
+    filename = filename.replace(" ", "_")
+    process_dir = data.get("process_dir", None)
+    enabled_checks = data.get("checks", None)
+    if enabled_checks is not None and not isinstance(enabled_checks, list):
+        return None, None, (jsonify({"error": "'checks' must be a list"}), 400)
+    no_cache = bool(data.get("no_cache", False))
+    
+    if not text or not isinstance(text, str):
+        return None, None, (jsonify({"error": "'text' must be a non-empty string"}), 400)
+    
+    # Convert relative path to absolute if needed
+    if process_dir and not os.path.isabs(process_dir):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process_dir = os.path.join(root, process_dir)
+        process_dir = os.path.normpath(process_dir)
+        file_path = os.path.join(os.path.dirname(os.path.dirname(process_dir)), filename)
+    
+    kwargs = {
+        "file_path": file_path,
+        "proj_path": process_dir,
+        "filename": filename,
+        "text": text,
+        "enabled_checks": enabled_checks,
+        "use_llm_cache": not no_cache,
+    }
+    context = {
+        "process_dir": process_dir,
+        "file_path": file_path,
+    }
+    return kwargs, context, None
 
 
 def check_text():
@@ -12,46 +60,18 @@ def check_text():
     {
         "text": "full extracted text from PDF",
         "filename": "original_filename",
-        "process_dir": "path to process directory"
+        "process_dir": "path to process directory",
+        "no_cache": false   (optional, true re-asks the LLM instead of
+                             reusing a cached response)
     }
     """
     try:
-        data = request.get_json()
-        if not data or "text" not in data:
-            return jsonify({"error": "Missing 'text' field"}), 400
-        
-        text = data["text"]
-        filename = data.get("filename", "unknown")
-        filename = filename.replace(" ", "_")
-        process_dir = data.get("process_dir", None)
-        enabled_checks = data.get("checks", None)
-        if enabled_checks is not None and not isinstance(enabled_checks, list):
-            return jsonify({"error": "'checks' must be a list"}), 400
-        
-        if not text or not isinstance(text, str):
-            return jsonify({"error": "'text' must be a non-empty string"}), 400
-        
-        # Convert relative path to absolute if needed
-        if process_dir and not os.path.isabs(process_dir):
-            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            process_dir = os.path.join(root, process_dir)
-            process_dir = os.path.normpath(process_dir)
-            file_path = os.path.join(os.path.dirname(os.path.dirname(process_dir)), filename)
+        kwargs, context, error = _read_check_request()
+        if error:
+            return error
         
-        results = run_checks(
-            file_path=file_path,
-            proj_path=process_dir,
-            filename=filename,
-            text=text,
-            enabled_checks=enabled_checks,
-        )
-        parsed = parse_check_log(
-            results,
-            context={
-                "process_dir": process_dir,
-                "file_path": file_path,
-            },
-        )
+        results = run_checks(**kwargs)
+        parsed = parse_check_log(results, context=context)
         
         return jsonify(parsed), 200
     
@@ -59,14 +79,52 @@ def check_text():
         return jsonify({"error": str(e)}), 500
 
 
+def check_text_stream():
+    """Same as /api/check, but streams server-sent events.
+
+    Events:
+        checks   parsed sections of every check but the summary, once done
+        summary  {"delta": "..."}, the summary text as the model writes it
+        done     the parsed sections /api/check would have returned
+        error    {"error": "..."}
+    """
+    try:
+        kwargs, context, error = _read_check_request()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if error:
+        return error
+
+    def generate():
+        try:
+            for event, payload in run_checks_stream(**kwargs):
+                if event == "checks":
+                    raw = {"filename": kwargs["filename"], "checks": payload}
+                    yield sse("checks", parse_check_log(raw, context=context))
+                elif event == "summary":
+                    yield sse("summary", {"delta": payload})
+                elif event == "done":
+                    yield sse("done", parse_check_log(payload, context=context))
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def get_text():
     """Retrieve text content from a file path.
     
     Query params:
         path: Full path to text file
+        page: Optional page ("3") or page range ("2-5") of a PDF page store
     """
     try:
         file_path = request.args.get('path', '')
+        page = request.args.get('page', '')
         
         if not file_path:
             return jsonify({"error": "Missing 'path' parameter"}), 400
@@ -74,8 +132,15 @@ def get_text():
         if not os.path.exists(file_path):
             return jsonify({"error": f"File not found: {file_path}"}), 404
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with PageStore(file_path) as store:
+            if page:
+                first, _, last = page.partition("-")
+                try:
+                    content = store.pages(int(first), int(last or first))
+                except (ValueError, IndexError) as e:
+                    return jsonify({"error": f"Invalid 'page' parameter: {e}"}), 400
+            else:
+                content = store.full_text()
         
         return content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
     
@@ -83,6 +148,11 @@ def get_text():
         return jsonify({"error": str(e)}), 500
 
 
+def llm_cache_stats():
+    """Hit/miss counters and on-disk size of the LLM response cache."""
+    return jsonify(llm_cache.stats()), 200
+
+
 def register_check_routes(app):
     """Register check-related routes with Flask app.
     
@@ -96,9 +166,23 @@ def register_check_routes(app):
         methods=["POST"]
     )
     
+    app.add_url_rule(
+        "/api/check/stream",
+        "check_text_stream",
+        check_text_stream,
+        methods=["POST"]
+    )
+    
     app.add_url_rule(
         "/get-text",
         "get_text",
         get_text,
         methods=["GET"]
     )
+
+    app.add_url_rule(
+        "/api/llm-cache",
+        "llm_cache_stats",
+        llm_cache_stats,
+        methods=["GET"]
+    )
@@ -24,9 +24,11 @@ def parse_check_log(raw: Dict[str, Any], *, context: Optional[Dict[str, Any]] =
       2. image_info
       3. cross_ref_info
       4. pdf_metadata
-      5. anonymity_check
-      6. hidden_prompt_check
-      7. summary_info
+      5. anonymity_scan_info
+      6. hidden_text_info
+      7. anonymity_check
+      8. hidden_prompt_check
+      9. summary_info
     """
     context = context or {}
     checks = raw.get("checks", []) if isinstance(raw, dict) else []
@@ -90,6 +92,30 @@ def parse_check_log(raw: Dict[str, Any], *, context: Optional[Dict[str, Any]] =
             "results": "metadata check not run",
         }
 
+    scan_check = _find_check(checks, check_type="anonymity_scan")
+    if scan_check:
+        anonymity_scan_info = {
+            "available": True,
+            "results": scan_check.get("results"),
+        }
+    else:
+        anonymity_scan_info = {
+            "available": False,
+            "results": "rule-based anonymity scan not run",
+        }
+
+    rendering_check = _find_check(checks, check_type="hidden_text")
+    if rendering_check:
+        hidden_text_info = {
+            "available": True,
+            "results": rendering_check.get("results"),
+        }
+    else:
+        hidden_text_info = {
+            "available": False,
+            "results": "hidden text check not run",
+        }
+
     anonymous_check = _find_check(checks, check_type="anonymous")
     if anonymous_check:
         anonymity_check = {
@@ -132,6 +158,8 @@ def parse_check_log(raw: Dict[str, Any], *, context: Optional[Dict[str, Any]] =
         "link_info": link_info,
         "cross_ref_info": cross_ref_info,
         "pdf_metadata": pdf_metadata,
+        "anonymity_scan_info": anonymity_scan_info,
+        "hidden_text_info": hidden_text_info,
         "anonymity_check": anonymity_check,
         "hidden_prompt_check": hidden_prompt_check,
         "summary_info": summary_info,
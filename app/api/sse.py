@@ -0,0 +1,6 @@
+import json
+
+
+def sse(event, data):
+    """One server-sent event: ``data`` as JSON under the given event name."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
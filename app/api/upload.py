@@ -1,30 +1,70 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.api.sse import sse
 from app.services.ingest import save_upload
-from app.services.pdf_parser import parse_pdf
+from app.services.pdf_parser import parse_pdf, iter_pdf_pages
 from app.services.latex_parser import parse_latex_zip
 import os
 
 
+def _build_report(filename, process_dir, summary, upload=None):
+    # Build response with parse/extraction info
+    report = {"filename": filename}
+    if upload:
+        report.update(upload)
+    # True when an identical earlier upload was reused without re-parsing
+    report["cached"] = bool(summary and summary.get("cached"))
+
+    # attach process info when available
+    if process_dir:
+        # make process_dir path relative to project root for readability
+        proj_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        try:
+            rel = os.path.relpath(process_dir, proj_root)
+        except Exception:
+            rel = process_dir
+        report["process_dir"] = rel
+
+        # Add full_text path for frontend to read and run checks
+        if summary and "full_text" in summary:
+            report["full_text"] = summary["full_text"]
+
+    return report
+
+
+def _accept_upload():
+    """Validate and store the uploaded file.
+
+    Returns (path, filename, layout, upload_info, None) on success, or
+    (None, None, None, None, error_response). ``filename`` is the stored,
+    content-addressed name; upload_info keeps the original name and digest.
+    """
+    if "file" not in request.files:
+        return None, None, None, None, (jsonify({"error": "no file provided"}), 400)
+
+    file = request.files["file"]
+    layout = request.form.get("layout", "auto")  # Get layout choice from form
+    filename = file.filename or ""
+    lower_name = filename.lower()
+    if not (lower_name.endswith(".pdf") or lower_name.endswith(".zip")):
+        return None, None, None, None, (jsonify({"error": "unsupported file type: only .pdf or .zip allowed"}), 400)
+    try:
+        path, stored_name, digest = save_upload(file)
+    except ValueError as e:
+        return None, None, None, None, (jsonify({"error": str(e)}), 413)
+    except Exception as e:
+        return None, None, None, None, (jsonify({"error": str(e)}), 500)
+    upload_info = {"original_filename": filename, "digest": digest}
+    return path, stored_name, layout, upload_info, None
+
+
 def register_routes(app):
     bp = Blueprint("api", __name__, url_prefix="/api")
 
     @bp.route("/upload", methods=["POST"])
     def upload_file():
-        if "file" not in request.files:
-            return jsonify({"error": "no file provided"}), 400
-
-        file = request.files["file"]
-        layout = request.form.get("layout", "single")  # Get layout choice from form
-        filename = file.filename or ""
-        lower_name = filename.lower()
-        if not (lower_name.endswith(".pdf") or lower_name.endswith(".zip")):
-            return jsonify({"error": "unsupported file type: only .pdf or .zip allowed"}), 400
-        try:
-            path, filename = save_upload(file)
-        except ValueError as e:
-            return jsonify({"error": str(e)}), 413
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        path, filename, layout, upload_info, error = _accept_upload()
+        if error:
+            return error
 
         # If PDF or LaTeX zip, run parser and save process outputs
         lower = filename.lower()
@@ -35,29 +75,59 @@ def register_routes(app):
                 process_dir, summary = None, {"error": str(e)}
         elif lower.endswith('.zip'):
             try:
-                process_dir, summary = parse_latex_zip(path, filename)
+                process_dir, summary = parse_latex_zip(path, filename, project=upload_info["original_filename"])
             except Exception as e:
                 process_dir, summary = None, {"error": str(e)}
         else:
             process_dir, summary = None, None
 
-        # Build response with parse/extraction info
-        report = {"filename": filename}
-        
-        # attach process info when available
-        if process_dir:
-            # make process_dir path relative to project root for readability
-            proj_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return jsonify(_build_report(filename, process_dir, summary, upload_info))
+
+    @bp.route("/upload/stream", methods=["POST"])
+    def upload_file_stream():
+        """Same as /upload, but streams parse progress as server-sent events.
+
+        Events: start, page, image, error, done. The "done" payload is the
+        report /upload would have returned.
+        """
+        path, filename, layout, upload_info, error = _accept_upload()
+        if error:
+            return error
+
+        def generate():
+            yield sse("start", {"filename": filename})
+            lower = filename.lower()
             try:
-                rel = os.path.relpath(process_dir, proj_root)
-            except Exception:
-                rel = process_dir
-            report["process_dir"] = rel
-            
-            # Add full_text path for frontend to read and run checks
-            if summary and "full_text" in summary:
-                report["full_text"] = summary["full_text"]
-
-        return jsonify(report)
+                if lower.endswith('.pdf'):
+                    for record in iter_pdf_pages(path, filename, layout_type=layout):
+                        kind = record["type"]
+                        if kind == "page":
+                            yield sse("page", {
+                                "page": record["page"],
+                                "pages": record["pages"],
+                                "chars": len(record["text"]),
+                            })
+                        elif kind == "image":
+                            yield sse("image", {
+                                "pages": record["pages"],
+                                "width": record.get("width"),
+                                "height": record.get("height"),
+                            })
+                        elif kind == "done":
+                            report = _build_report(
+                                filename, record["process_dir"], record["summary"], upload_info
+                            )
+                            yield sse("done", report)
+                else:
+                    process_dir, summary = parse_latex_zip(path, filename, project=upload_info["original_filename"])
+                    yield sse("done", _build_report(filename, process_dir, summary, upload_info))
+            except Exception as e:
+                yield sse("error", {"error": str(e)})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     app.register_blueprint(bp)
@@ -2,48 +2,143 @@ from app.checks.rule_based.image_quality import image_quality_check
 from app.checks.rule_based.link_extractor import check_links_existence
 from app.checks.rule_based.metadata import extract_metadata
 from app.checks.rule_based.cross_ref import cross_ref_check
-from app.checks.llm_based.llm_check import llm_check, llm_summary
+from app.checks.rule_based.anonymity_scan import anonymity_scan_check
+from app.checks.rule_based.hidden_text import HiddenTextScan, hidden_text_check
+from app.checks.llm_based.llm_check import (
+    MergedLLMChecks,
+    llm_check_async,
+    llm_summary_async,
+    llm_summary_stream_async,
+)
+from app.checks.scheduler import COST_CPU, COST_IO, COST_LLM, DEP_RESULTS, CheckSpec, _error_result, run_scheduled
+from app.config import LLM_MERGE_CHECKS
+from app.services.latex_tokens import load_document_tokens
+from app.services.source_map import load_locator
+from app.services.workers import iterate_async
 import json
 
 
-DEFAULT_CHECKS = {"image_quality", "link_anonymization", "pdf_metadata", "cross_ref"}
+DEFAULT_CHECKS = {
+    "image_quality", "link_anonymization", "pdf_metadata", "cross_ref", "anonymity_scan", "hidden_text",
+}
 
 
-def run_checks(file_path, proj_path, filename, text, enabled_checks=None):
-    checks = []
-    enabled = DEFAULT_CHECKS if enabled_checks is None else set(enabled_checks)
+def _link_check(text, proj_path):
+    # LaTeX projects reuse the parser's token stream; PDFs scan the text
+    document = load_document_tokens(proj_path)
+    return check_links_existence(
+        text,
+        tokens=document[1] if document else None,
+        locator=load_locator(proj_path),
+    )
+
 
-    if "image_quality" in enabled:
-        image_res = image_quality_check(proj_path)
-        checks.append(image_res)
+def _anonymity_scan_check(text, proj_path):
+    return anonymity_scan_check(text, locator=load_locator(proj_path))
 
-    if "link_anonymization" in enabled:
-        links_res = check_links_existence(text)
-        checks.append(links_res)
 
-    if "pdf_metadata" in enabled:
-        meta_res = extract_metadata(file_path)
-        checks.append(meta_res)
+async def _summary_check(dep_results, use_llm_cache):
+    return await llm_summary_async(str(dep_results), use_llm_cache)
 
-    if "cross_ref" in enabled:
-        cross_res = cross_ref_check(file_path, proj_path)
-        checks.append(cross_res)
 
-    if "anonymity" in enabled:
-        anonymous_res = llm_check(file_path, "anonymous")
-        checks.append(anonymous_res)
+# Registry order is the order results are reported in
+CHECKS = [
+    CheckSpec("image_quality", "images", image_quality_check, ("proj_path",), COST_IO),
+    CheckSpec("link_anonymization", "links", _link_check, ("text", "proj_path"), COST_CPU),
+    CheckSpec("pdf_metadata", "metadata", extract_metadata, ("file_path",), COST_IO),
+    CheckSpec("cross_ref", "cross_ref", cross_ref_check, ("file_path", "proj_path"), COST_CPU),
+    CheckSpec("anonymity_scan", "anonymity_scan", _anonymity_scan_check, ("text", "proj_path"), COST_CPU),
+    # Reads the run's shared scan (HiddenTextScan), which runs in the thread
+    # of whichever check asks first
+    CheckSpec("hidden_text", "hidden_text", hidden_text_check, ("file_path", "hidden_scan"), COST_IO),
+    CheckSpec(
+        "anonymity", "anonymous", llm_check_async,
+        ("file_path", "anonymous_preset", "use_llm_cache", "llm_batch"), COST_LLM,
+    ),
+    CheckSpec(
+        "hidden_prompt", "hidden", llm_check_async,
+        ("file_path", "hidden_preset", "use_llm_cache", "llm_batch", "hidden_scan"), COST_LLM,
+    ),
+    CheckSpec(
+        "summary", "summary", _summary_check, (DEP_RESULTS, "use_llm_cache"), COST_LLM,
+        deps=(
+            "image_quality", "link_anonymization", "pdf_metadata", "cross_ref", "anonymity_scan",
+            "hidden_text", "anonymity", "hidden_prompt",
+        ),
+    ),
+]
 
-    if "hidden_prompt" in enabled:
-        hidden_res = llm_check(file_path, "hidden")
-        checks.append(hidden_res)
 
-        
-    if "summary" in enabled:
-        summary_res = llm_summary(str(checks))
-        checks.append(summary_res)
+def _check_context(file_path, proj_path, text, enabled, use_llm_cache):
+    # One hidden text scan per run, shared by every check that reads it
+    hidden_scan = None
+    if file_path.lower().endswith(".pdf") and enabled & {"hidden_text", "hidden_prompt"}:
+        hidden_scan = HiddenTextScan(file_path)
+    # Both LLM document checks enabled: one combined request answers them
+    llm_batch = None
+    if LLM_MERGE_CHECKS and {"anonymity", "hidden_prompt"} <= enabled:
+        llm_batch = MergedLLMChecks(file_path, ("anonymous", "hidden"), use_llm_cache, hidden_scan)
+    return {
+        "file_path": file_path,
+        "proj_path": proj_path,
+        "text": text,
+        "anonymous_preset": "anonymous",
+        "hidden_preset": "hidden",
+        "use_llm_cache": use_llm_cache,
+        "llm_batch": llm_batch,
+        "hidden_scan": hidden_scan,
+    }
 
+
+def _save_results(proj_path, checks):
     save_path = proj_path + "/check_results.json"
     with open(save_path, "w") as f:
         json.dump(checks, f, indent=4)
 
+
+def run_checks(file_path, proj_path, filename, text, enabled_checks=None, use_llm_cache=True):
+    enabled = DEFAULT_CHECKS if enabled_checks is None else set(enabled_checks)
+
+    checks = run_scheduled(CHECKS, enabled, _check_context(file_path, proj_path, text, enabled, use_llm_cache))
+    _save_results(proj_path, checks)
+
     return {"filename": filename, "checks": checks}
+
+
+def run_checks_stream(file_path, proj_path, filename, text, enabled_checks=None, use_llm_cache=True):
+    """run_checks as a generator of (event, payload) pairs, for streaming:
+
+        ("checks", checks)    every check but the summary, once they are done
+        ("summary", delta)    summary text as the model writes it
+        ("done", report)      what run_checks returns, after
+                              check_results.json is written (with the
+                              assembled summary)
+    """
+    enabled = DEFAULT_CHECKS if enabled_checks is None else set(enabled_checks)
+    summary_spec = next(spec for spec in CHECKS if spec.name == "summary")
+    specs = [spec for spec in CHECKS if spec.name in enabled and spec is not summary_spec]
+
+    checks = run_scheduled(specs, enabled, _check_context(file_path, proj_path, text, enabled, use_llm_cache))
+    yield "checks", list(checks)
+
+    # The summary is last in the registry, so appending keeps registry order
+    if summary_spec.name in enabled:
+        by_name = {spec.name: result for spec, result in zip(specs, checks)}
+        dep_results = [by_name[name] for name in by_name if name in summary_spec.deps]
+        parts = []
+        try:
+            for delta in iterate_async(
+                llm_summary_stream_async(str(dep_results), use_llm_cache),
+                timeout=summary_spec.time_limit(),
+            ):
+                parts.append(delta)
+                yield "summary", delta
+            summary = {"check_type": "summary", "results": "".join(parts)}
+        except TimeoutError:
+            summary = _error_result(summary_spec, f"timed out after {summary_spec.time_limit():g}s")
+        except Exception as e:
+            summary = {"check_type": "summary", "results": str(e)}
+        checks.append(summary)
+
+    _save_results(proj_path, checks)
+    yield "done", {"filename": filename, "checks": checks}
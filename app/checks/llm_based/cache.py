@@ -0,0 +1,144 @@
+"""Persistent cache of LLM responses.
+
+Responses live in a SQLite file (LLM_CACHE_PATH, by default under
+UPLOAD_DIR) keyed by a SHA-256 of (model, api_base, system + user prompt,
+document digest). The document digest covers the bytes that would be sent:
+the uploaded PDF, a LaTeX upload's merged text, or the check log for the
+summary. Re-running the same checks on an unchanged paper is therefore
+answered from disk, while any change to the text, the prompt or the model
+misses.
+
+The file is bounded by LLM_CACHE_MAX_BYTES; once it grows past that the
+least recently used responses are evicted. LLM_CACHE_ENABLED=0 disables the
+cache, and callers can bypass it per request with ``use_cache=False``
+(the response is still stored, so the next cached run sees it).
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Optional, Tuple
+
+from app.config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_BYTES, LLM_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    api_base TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+_lock = threading.Lock()
+_initialized = set()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+# (path, size, mtime_ns) -> digest, so a PDF is hashed once per upload
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def _connect(path: str = LLM_CACHE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(path)
+    return conn
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, memoized on (path, size, mtime)."""
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = _digests[memo_key] = h.hexdigest()
+    return digest
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model: str, api_base: str, system_prompt: Optional[str], prompt: str, document_digest: str) -> str:
+    prompt_digest = text_digest(f"{system_prompt or ''}\x00{prompt}")
+    return text_digest("\x00".join([model or "", api_base or "", prompt_digest, document_digest]))
+
+
+def get(key: str) -> Optional[str]:
+    """Cached response for ``key``, or None; counts a hit or a miss."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        with _lock, closing(_connect()) as conn, conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            _stats["hits" if row is not None else "misses"] += 1
+    except sqlite3.Error as e:
+        logger.warning("LLM cache read failed: %s", e)
+        return None
+    return row[0] if row is not None else None
+
+
+def put(key: str, model: str, api_base: str, response: Optional[str]) -> None:
+    """Store ``response`` and evict least recently used entries past the size cap."""
+    if not LLM_CACHE_ENABLED or response is None:
+        return
+    now = time.time()
+    size = len(response.encode("utf-8"))
+    try:
+        with _lock, closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model or "", api_base or "", response, size, now, now),
+            )
+            _stats["stores"] += 1
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= LLM_CACHE_MAX_BYTES:
+                return
+            for old_key, old_size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_used"
+            ).fetchall():
+                if total <= LLM_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                total -= old_size
+                _stats["evictions"] += 1
+    except sqlite3.Error as e:
+        logger.warning("LLM cache write failed: %s", e)
+
+
+def stats() -> Dict[str, int]:
+    """Hit/miss/store/eviction counters of this process, plus the entry count
+    and total response bytes on disk."""
+    result = dict(_stats)
+    if LLM_CACHE_ENABLED:
+        try:
+            with _lock, closing(_connect()) as conn:
+                entries, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            result.update(entries=entries, bytes=size)
+        except sqlite3.Error:
+            pass
+    return result
+
+
+def clear() -> None:
+    with _lock, closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM responses")
@@ -0,0 +1,216 @@
+"""Map-reduce LLM checks for papers that do not fit in one prompt.
+
+When the document has to be sent inline (the provider has no file API)
+and is longer than LLM_CHUNK_TOKENS, the merged text is cut into chunks:
+
+- preferably at section starts (LaTeX: \\chapter, \\section, \\subsection,
+  \\appendix) or page starts (PDF),
+- else at a blank line, and only as a last resort mid-paragraph,
+
+each no longer than the budget (estimated at CHARS_PER_TOKEN characters per
+token). Every chunk is checked concurrently with the same preset; the
+per-chunk JSON arrays are then merged into one list where findings with the
+same type and snippet appear once, each carrying its provenance:
+
+    "chunks": [0, 2]            chunk indexes that reported it
+    "offset": 10412             first occurrence of the snippet in the
+                                merged text (None if not found verbatim)
+    "source": "sec/method.tex:42" or "page 7", when it can be located
+
+A combined preset (several checks in one request) is reduced per section.
+"""
+
+import asyncio
+import bisect
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.config import LLM_CHUNK_MODE, LLM_CHUNK_TOKENS
+from app.checks.llm_based import providers
+from app.checks.llm_based.model import _request_openai_text_async, _text_path, llm_to_json
+from app.services.latex_tokens import load_document_tokens
+from app.services.page_store import read_full_text
+from app.services.source_map import DocumentLocator, _pdf_page_starts, load_locator
+
+CHARS_PER_TOKEN = 4
+
+_SECTION_COMMANDS = {"part", "chapter", "section", "section*", "subsection", "subsection*", "appendix"}
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+_CONFIDENCE_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+def _full_text_path(file_path: str) -> str:
+    path = _text_path(file_path)
+    if path.lower().endswith(".pdf"):
+        path = path.replace("/uploads/", "/uploads/process/").rsplit(".", 1)[0] + "__pdf/full_text.txt"
+    return path
+
+
+def load_document(file_path: str) -> Tuple[str, List[int], Optional[DocumentLocator]]:
+    """(merged text, preferred split offsets, locator) of an upload."""
+    full_text_path = _full_text_path(file_path)
+    proj_path = os.path.dirname(full_text_path)
+    document = load_document_tokens(proj_path)
+    if document is not None:
+        text, tokens = document
+        boundaries = [t.start for t in tokens if t.kind == "cmd" and t.name in _SECTION_COMMANDS]
+    else:
+        text = read_full_text(full_text_path)
+        boundaries = _pdf_page_starts(full_text_path)
+    return text, boundaries, load_locator(proj_path)
+
+
+def _last_at_most(sorted_offsets: List[int], low: int, high: int) -> Optional[int]:
+    """Largest offset in (low, high], or None."""
+    i = bisect.bisect_right(sorted_offsets, high) - 1
+    if i >= 0 and sorted_offsets[i] > low:
+        return sorted_offsets[i]
+    return None
+
+
+def split_chunks(text: str, boundaries: List[int], budget_chars: int) -> List[Tuple[int, int]]:
+    """Cut ``text`` into (start, end) spans of at most ``budget_chars``,
+    preferring ``boundaries``, then blank lines."""
+    budget_chars = max(1, budget_chars)
+    boundaries = sorted(set(boundaries))
+    paragraphs = [m.end() for m in _PARAGRAPH_BREAK.finditer(text)]
+    spans = []
+    start = 0
+    while start < len(text):
+        limit = start + budget_chars
+        if limit >= len(text):
+            end = len(text)
+        else:
+            end = (
+                _last_at_most(boundaries, start, limit)
+                or _last_at_most(paragraphs, start, limit)
+                or limit
+            )
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def plan_chunks(file_path: str, api_base: str) -> Optional[Tuple[str, List[int], Optional[DocumentLocator]]]:
+    """The loaded document when a check of ``file_path`` should be split,
+    else None. LLM_CHUNK_MODE is "off", "always" (whenever over budget) or
+    "auto" (over budget and the provider is known not to take uploads; a
+    provider not probed yet gets the file uploaded, which probes it)."""
+    if LLM_CHUNK_MODE == "off":
+        return None
+    if LLM_CHUNK_MODE != "always" and providers.capability(api_base, "file_upload") is not False:
+        return None
+    budget_chars = LLM_CHUNK_TOKENS * CHARS_PER_TOKEN
+    # A file of at most budget bytes cannot hold more than budget characters
+    if os.path.getsize(_full_text_path(file_path)) <= budget_chars:
+        return None
+    document = load_document(file_path)
+    if len(document[0]) <= budget_chars:
+        return None
+    return document
+
+
+def _finding_key(finding: Dict[str, Any]) -> Tuple[str, str]:
+    location = " ".join(str(finding.get("location", "")).split()).lower()
+    return str(finding.get("type", "")), location
+
+
+def _find_snippet(text: str, snippet: str, start: int, end: int) -> int:
+    """Offset of ``snippet`` in text[start:end], tolerating whitespace and
+    case differences (models reflow quotes); -1 when absent."""
+    offset = text.find(snippet, start, end)
+    if offset >= 0 or not snippet.split():
+        return offset
+    pattern = re.compile(r"\s+".join(map(re.escape, snippet.split())), re.IGNORECASE)
+    match = pattern.search(text, start, end)
+    return match.start() if match else -1
+
+
+def reduce_findings(text: str, spans: List[Tuple[int, int]], chunk_results: List[Any],
+                    locator: Optional[DocumentLocator] = None) -> List[Dict[str, Any]]:
+    """Merge per-chunk results into one deduplicated list with provenance.
+
+    A chunk whose response is not a JSON array is kept as one
+    "Unparsed Response" finding rather than dropped.
+    """
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for index, ((start, end), result) in enumerate(zip(spans, chunk_results)):
+        if not isinstance(result, list):
+            result = [{"type": "Unparsed Response", "location": str(result), "confidence": "low"}]
+        for finding in result:
+            if not isinstance(finding, dict):
+                finding = {"type": "Unparsed Response", "location": str(finding), "confidence": "low"}
+            key = _finding_key(finding)
+            existing = merged.get(key)
+            if existing is None:
+                snippet = str(finding.get("location", "")).strip()
+                offset = _find_snippet(text, snippet, start, end) if snippet else -1
+                entry = dict(finding)
+                entry["chunks"] = [index]
+                entry["offset"] = offset if offset >= 0 else None
+                entry["source"] = locator.locate(offset) if locator is not None and offset >= 0 else None
+                merged[key] = entry
+                continue
+            if index not in existing["chunks"]:
+                existing["chunks"].append(index)
+            # Keep the most confident report's wording
+            if (_CONFIDENCE_RANK.get(str(finding.get("confidence")).lower(), -1)
+                    > _CONFIDENCE_RANK.get(str(existing.get("confidence")).lower(), -1)):
+                existing.update({k: v for k, v in finding.items() if k != "location"})
+    return list(merged.values())
+
+
+async def chunked_check_async(
+    text: str,
+    boundaries: List[int],
+    locator: Optional[DocumentLocator],
+    *,
+    base_url: str,
+    api_key: Optional[str],
+    model: str,
+    prompt: str,
+    system_prompt: Optional[str],
+    use_cache: bool = True,
+    sections: Optional[Sequence[str]] = None,
+) -> Union[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Run one preset over every chunk concurrently and reduce the findings.
+
+    With ``sections`` (a combined preset) the findings are reduced per
+    section and returned as ``{section: findings}``.
+    """
+    spans = split_chunks(text, boundaries, LLM_CHUNK_TOKENS * CHARS_PER_TOKEN)
+    responses = await asyncio.gather(*(
+        _request_openai_text_async(
+            base_url=base_url,
+            api_key=api_key,
+            model=model,
+            prompt=prompt,
+            system_prompt=system_prompt,
+            content=f"[part {i + 1} of {len(spans)}]\n\n" + text[start:end],
+            use_cache=use_cache,
+            json_mode=sections is not None,
+        )
+        for i, (start, end) in enumerate(spans)
+    ))
+    results = [llm_to_json(r, sections) if r is not None else r for r in responses]
+    if sections is None:
+        return reduce_findings(text, spans, results, locator)
+    return {
+        name: reduce_findings(
+            text, spans, [r[name] if isinstance(r, dict) else r for r in results], locator,
+        )
+        for name in sections
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    # "auto" leaves an unprobed provider to the upload path, whatever the length
+    unprobed = "http://unprobed.invalid/v1"
+    ok = providers.capability(unprobed, "file_upload") is None and (
+        LLM_CHUNK_MODE != "auto" or plan_chunks("never-parsed.pdf", unprobed) is None
+    )
+    print("unprobed provider OK" if ok else "unprobed provider FAILED")
+    sys.exit(0 if ok else 1)
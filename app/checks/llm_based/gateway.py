@@ -0,0 +1,110 @@
+"""Process-wide access point for the LLM provider.
+
+The gateway reads ``config.json`` (next to this module) once, re-reading it
+only when its mtime changes, and lets the environment override each field:
+
+    LLM_API_KEY, LLM_API_BASE, LLM_MODEL_NAME
+
+It also keeps one OpenAI / AsyncOpenAI client per (api_base, api_key), so
+every check reuses the same HTTP connection pool (keep-alive, TLS sessions)
+instead of paying for a new connection on each request.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from openai import AsyncOpenAI, OpenAI
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# config.json field -> environment variable overriding it
+_ENV_OVERRIDES = {
+    "api_key": "LLM_API_KEY",
+    "api_base": "LLM_API_BASE",
+    "model_name": "LLM_MODEL_NAME",
+}
+
+
+class LLMConfig(NamedTuple):
+    api_key: str
+    api_base: str
+    model_name: str
+
+
+class LLMGateway:
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        self._file_config: Dict[str, str] = {}
+        self._clients: Dict[Tuple[str, str], OpenAI] = {}
+        self._async_clients: Dict[Tuple[str, str, int], AsyncOpenAI] = {}
+
+    def _file_values(self) -> Dict[str, str]:
+        try:
+            mtime_ns = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            self._mtime_ns, self._file_config = None, {}
+            return self._file_config
+        if mtime_ns != self._mtime_ns:
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                values = json.load(f)
+            if not isinstance(values, dict):
+                raise ValueError(f"LLM config {self.config_path} must be a JSON object")
+            self._mtime_ns, self._file_config = mtime_ns, values
+        return self._file_config
+
+    def config(self) -> LLMConfig:
+        """Current settings: config.json reloaded if it changed, then the
+        environment overrides. Raises ValueError when a field is missing."""
+        with self._lock:
+            values = dict(self._file_values())
+        for field, env_name in _ENV_OVERRIDES.items():
+            if os.getenv(env_name):
+                values[field] = os.environ[env_name]
+        missing = [field for field in _ENV_OVERRIDES if not values.get(field)]
+        if missing:
+            raise ValueError(
+                f"LLM config incomplete, missing {', '.join(missing)} "
+                f"(set them in {self.config_path} or via "
+                f"{', '.join(_ENV_OVERRIDES[m] for m in missing)})"
+            )
+        return LLMConfig(values["api_key"], values["api_base"].rstrip("/"), values["model_name"])
+
+    def client(self, api_base: str, api_key: Optional[str]) -> OpenAI:
+        """Shared synchronous client for (api_base, api_key)."""
+        key = (api_base, api_key or "")
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = OpenAI(api_key=api_key, base_url=api_base)
+            return client
+
+    def async_client(self, api_base: str, api_key: Optional[str]) -> AsyncOpenAI:
+        """Shared async client for (api_base, api_key) on the running loop.
+
+        Async connection pools belong to one event loop, so clients are kept
+        per loop as well (in practice there is only the workers' loop).
+        """
+        key = (api_base, api_key or "", id(asyncio.get_running_loop()))
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = self._async_clients[key] = AsyncOpenAI(api_key=api_key, base_url=api_base)
+            return client
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide gateway, creating it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
@@ -2,47 +2,242 @@ import sys
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[3]
 sys.path.insert(0, str(ROOT))
+from app.config import LLM_HIDDEN_SCOPE
 from app.checks.llm_based.prompts import PRESETS
-from app.checks.llm_based.model import _request_openai_text, llm_to_json
-import json
+from app.checks.llm_based.chunked import chunked_check_async, plan_chunks
+from app.checks.llm_based.gateway import get_gateway
+from app.checks.llm_based.model import _request_openai_text_async, _stream_summary_async, llm_to_json
+from app.checks.llm_based.preselect import (
+    excerpts_content,
+    hidden_spans_content,
+    locate_findings,
+    locate_hidden_findings,
+    plan_excerpts,
+    plan_hidden_spans,
+)
+from app.services.workers import run_blocking, submit_coroutine
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
 
-def llm_check(file_path: str, check_type: str) -> dict:
-    with open("app\checks\llm_based\config.json", "r") as f:
-        config = f.read()
-    config = json.loads(config)
+logger = logging.getLogger(__name__)
+
+
+class MergedLLMChecks:
+    """Several preset checks of one document answered by a single combined
+    request, shared by the checks of one run.
+
+    The first check to ask starts the request; the others await the same
+    task. A check gets None (and runs its own request) when the combined
+    request does not apply: the anonymity check would only see excerpts
+    (LLM_ANONYMITY_SCOPE), the hidden-prompt check would not see the whole
+    document (LLM_HIDDEN_SCOPE), or the response could not be split.
+    ``hidden_scan`` is the run's shared hidden text scan, if any.
+    """
+
+    def __init__(self, file_path: str, check_types=("anonymous", "hidden"), use_cache: bool = True,
+                 hidden_scan=None):
+        self.file_path = file_path.replace("\\", "/")
+        self.check_types = tuple(check_types)
+        self.use_cache = use_cache
+        self.hidden_scan = hidden_scan
+        self._task: Optional[asyncio.Task] = None
+        self._excerpts_task: Optional[asyncio.Task] = None
+
+    async def excerpts(self):
+        """plan_excerpts of the document, planned once for the run."""
+        if self._excerpts_task is None:
+            self._excerpts_task = asyncio.ensure_future(run_blocking(plan_excerpts, self.file_path))
+        return await asyncio.shield(self._excerpts_task)
+
+    async def result(self, check_type: str) -> Optional[dict]:
+        if check_type not in self.check_types:
+            return None
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        # Shielded: a check that times out must not cancel the others' request
+        results = await asyncio.shield(self._task)
+        if check_type not in results:
+            return None
+        return {"check_type": check_type, "results": results[check_type]}
+
+    async def _run(self) -> dict:
+        try:
+            # Excerpts send far fewer tokens than a combined whole-paper request
+            if "anonymous" in self.check_types and await self.excerpts() is not None:
+                return {}
+            if "hidden" in self.check_types and await run_blocking(plan_hidden_spans, self.file_path, self.hidden_scan) is not None:
+                return {}
+            config = get_gateway().config()
+            document = await run_blocking(plan_chunks, self.file_path, config.api_base)
+            if document is not None:
+                return await chunked_check_async(
+                    *document,
+                    base_url=config.api_base,
+                    api_key=config.api_key,
+                    model=config.model_name,
+                    prompt=PRESETS["combined"],
+                    system_prompt=PRESETS["system"],
+                    use_cache=self.use_cache,
+                    sections=self.check_types,
+                )
+            response_text = await _request_openai_text_async(
+                file_path=self.file_path,
+                base_url=config.api_base,
+                api_key=config.api_key,
+                model=config.model_name,
+                prompt=PRESETS["combined"],
+                system_prompt=PRESETS["system"],
+                use_cache=self.use_cache,
+                json_mode=True,
+            )
+            results = llm_to_json(response_text, self.check_types) if response_text is not None else None
+            return results if isinstance(results, dict) else {}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Combined LLM check failed, checking separately: %s", e)
+            return {}
+
+
+async def llm_check_async(file_path: str, check_type: str, use_cache: bool = True,
+                          batch: Optional[MergedLLMChecks] = None, hidden_scan=None) -> dict:
+    """Run one preset check ("anonymous", "hidden") without blocking a thread.
+
+    ``use_cache=False`` skips the response cache and always asks the model.
+    The anonymity check sees only the excerpts a local pre-pass selects
+    (see preselect.py); the hidden-prompt check of a PDF can be skipped or
+    narrowed by the rendering-level hidden text scan (LLM_HIDDEN_SCOPE);
+    papers too long for one inline prompt are checked chunk by chunk
+    (see chunked.py). With ``batch``, the check is answered by the run's
+    combined request when it applies (LLM_MERGE_CHECKS). ``hidden_scan``
+    shares the run's hidden text scan (rule_based/hidden_text.py).
+    """
     file_path = file_path.replace("\\", "/")  # debug
     try:
-        response_text = _request_openai_text(
+        if batch is not None:
+            merged = await batch.result(check_type)
+            if merged is not None:
+                return merged
+        config = get_gateway().config()
+        excerpts = None
+        if check_type == "anonymous":
+            excerpts = await (batch.excerpts() if batch is not None else run_blocking(plan_excerpts, file_path))
+        if excerpts is not None:
+            text, spans, locator = excerpts
+            response_text = await _request_openai_text_async(
+                base_url=config.api_base,
+                api_key=config.api_key,
+                model=config.model_name,
+                prompt=PRESETS[check_type] + PRESETS["excerpts_note"],
+                system_prompt=PRESETS["system"],
+                content=excerpts_content(text, spans),
+                use_cache=use_cache,
+            )
+            results = locate_findings(llm_to_json(response_text), text, spans, locator)
+            return {"check_type": check_type, "results": results}
+        hidden_spans = await run_blocking(plan_hidden_spans, file_path, hidden_scan) if check_type == "hidden" else None
+        if hidden_spans is not None and not hidden_spans:
+            return {
+                "check_type": check_type,
+                "results": "No hidden text found in the PDF rendering; LLM check skipped.",
+            }
+        if hidden_spans and LLM_HIDDEN_SCOPE == "spans":
+            response_text = await _request_openai_text_async(
+                base_url=config.api_base,
+                api_key=config.api_key,
+                model=config.model_name,
+                prompt=PRESETS[check_type] + PRESETS["hidden_spans_note"],
+                system_prompt=PRESETS["system"],
+                content=hidden_spans_content(hidden_spans),
+                use_cache=use_cache,
+            )
+            results = locate_hidden_findings(llm_to_json(response_text), hidden_spans)
+            return {"check_type": check_type, "results": results}
+        document = await run_blocking(plan_chunks, file_path, config.api_base)
+        if document is not None:
+            results = await chunked_check_async(
+                *document,
+                base_url=config.api_base,
+                api_key=config.api_key,
+                model=config.model_name,
+                prompt=PRESETS[check_type],
+                system_prompt=PRESETS["system"],
+                use_cache=use_cache,
+            )
+            return {"check_type": check_type, "results": results}
+        response_text = await _request_openai_text_async(
             file_path=file_path,
-            base_url=config.get("api_base"),
-            api_key=config.get("api_key"),
-            model=config.get("model_name"),
+            base_url=config.api_base,
+            api_key=config.api_key,
+            model=config.model_name,
             prompt=PRESETS[check_type],
             system_prompt=PRESETS["system"],
+            use_cache=use_cache,
         )
         return {"check_type": check_type, "results": llm_to_json(response_text)}
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         return {"check_type": check_type, "results": str(e)}
-    
 
-def llm_summary(check_log: str) -> str:
-    with open("app\checks\llm_based\config.json", "r") as f:
-        config = f.read()
-    config = json.loads(config)
+
+async def llm_checks_async(file_path: str, check_types: list, use_cache: bool = True) -> list:
+    """Run several preset checks concurrently; results follow ``check_types``."""
+    return list(await asyncio.gather(*(llm_check_async(file_path, t, use_cache) for t in check_types)))
+
+
+async def llm_summary_async(check_log: str, use_cache: bool = True) -> dict:
     try:
-        response_text = _request_openai_text(
-            base_url=config.get("api_base"),
-            api_key=config.get("api_key"),
-            model=config.get("model_name"),
+        config = get_gateway().config()
+        response_text = await _request_openai_text_async(
+            base_url=config.api_base,
+            api_key=config.api_key,
+            model=config.model_name,
             prompt=PRESETS["summary"],
             system_prompt=PRESETS["system"],
             summary=True,
-            check_logs=check_log
+            check_logs=check_log,
+            use_cache=use_cache,
         )
         return {"check_type": "summary", "results": response_text}
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         return {"check_type": "summary", "results": str(e)}
-    
+
+
+async def llm_summary_stream_async(check_log: str, use_cache: bool = True) -> AsyncIterator[str]:
+    """llm_summary_async, yielding the summary text as it is generated.
+
+    Errors are raised to the caller instead of becoming the summary text.
+    """
+    config = get_gateway().config()
+    async for delta in _stream_summary_async(
+        base_url=config.api_base,
+        api_key=config.api_key,
+        model=config.model_name,
+        prompt=PRESETS["summary"],
+        system_prompt=PRESETS["system"],
+        check_logs=check_log,
+        use_cache=use_cache,
+    ):
+        yield delta
+
+
+# Synchronous wrappers: run on the shared event loop and wait for the result
+
+def llm_check(file_path: str, check_type: str, use_cache: bool = True) -> dict:
+    return submit_coroutine(llm_check_async(file_path, check_type, use_cache)).result()
+
+
+def llm_checks(file_path: str, check_types: list, use_cache: bool = True) -> list:
+    return submit_coroutine(llm_checks_async(file_path, check_types, use_cache)).result()
+
+
+def llm_summary(check_log: str, use_cache: bool = True) -> dict:
+    return submit_coroutine(llm_summary_async(check_log, use_cache)).result()
+
 if __name__ == "__main__":
     result = llm_summary("""
                 [{'check_type': 'images', 'results': {'images': [{'filename': 'page_2_img_1.png', 'width': 460, 'height': 471, 'dpi_x': 96.012, 'dpi_y': 96.012}], 'note': "DPI means the image's embedded metadata, NOT the PDF print DPI."}}, {'check_type': 'links', 'results': {'links_found': 1, 'links': ['https://github.com/real-username/private-research-project'], 'has_http_links': True}}, {'check_type': 'metadata', 'results': {'/Author': 'David S. Hippocampus', '/CreationDate': 'D:20260211092316Z', '/Creator': 'LaTeX with hyperref', '/Keywords': '', '/ModDate': 'D:20260211092316Z', '/PTEX.Fullbanner': 'This is pdfTeX, Version 3.141592653-2.6-1.40.27 (TeX Live 2025) kpathsea version 6.4.1', '/Producer': 'pdfTeX-1.40.27', '/Subject': '', '/Title': '', '/Trapped': '/False'}}, {'check_type': 'cross_ref', 'results': 'Input is a PDF file, cross-ref check requires LaTeX source'}]                         
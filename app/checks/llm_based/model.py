@@ -2,15 +2,27 @@ import sys
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[3]
 sys.path.insert(0, str(ROOT))
+import asyncio
 import json
-from typing import Any, Optional
-from openai import OpenAI
+import logging
+import os
+from typing import Any, AsyncIterator, Optional, Sequence
 import re
+from openai import APIStatusError
+from app.config import LLM_MAX_CONCURRENCY
+from app.checks.llm_based import cache, providers
+from app.checks.llm_based.gateway import get_gateway
+from app.services.page_store import read_full_text
 
-def llm_to_json(response: str) -> dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+def llm_to_json(response: str, sections: Sequence[str] | None = None) -> dict[str, Any]:
     """
     Parse LLM response containing a fenced ```json code block
     and return a dict suitable for frontend visualization.
+
+    With ``sections`` (a combined preset), the response must be an object
+    holding every section; anything else is returned unparsed (a string).
     """
     try:
         if "```json" in response:  # deepseek style
@@ -25,17 +37,182 @@ def llm_to_json(response: str) -> dict[str, Any]:
     except json.JSONDecodeError as e:
         parsed = response
 
+    if sections is not None:
+        if not isinstance(parsed, dict) or any(name not in parsed for name in sections):
+            return response
+        return {name: parsed[name] for name in sections}
     return parsed
 
-def get_content(file_path: str) -> str:
+def _inline_text_path(file_path: str) -> str:
+    """Text file whose content is sent when the document goes inline."""
     if file_path[-4:].lower() == ".pdf":
         file_path = file_path.replace("/uploads/", "/uploads/process/").rsplit(".", 1)[0]
         file_path = file_path + "__pdf/full_text.txt"
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+    return file_path
+
+def get_content(file_path: str) -> str:
+    return read_full_text(_inline_text_path(file_path))
 
 def _build_openai_client(base_url: str, api_key: str | None):
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return get_gateway().client(base_url, api_key)
+
+def _build_async_openai_client(base_url: str, api_key: str | None):
+    return get_gateway().async_client(base_url, api_key)
+
+# One semaphore per provider (api_base), created lazily on the event loop
+_provider_semaphores: dict[str, asyncio.Semaphore] = {}
+
+def _provider_semaphore(base_url: str) -> asyncio.Semaphore:
+    semaphore = _provider_semaphores.get(base_url)
+    if semaphore is None:
+        semaphore = _provider_semaphores[base_url] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
+
+def _text_path(file_path: str) -> str:
+    """File to send for a check: the PDF itself, or a LaTeX upload's merged text."""
+    if file_path[-4:].lower() != ".pdf":
+        file_path = file_path.replace("/uploads/", "/uploads/process/").rsplit(".", 1)[0] + "__latex/full_text.txt"
+    return file_path
+
+def _file_id_messages(system_prompt: Optional[str], prompt: str, file_id: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": f'fileid://{file_id}'},   # qwen-long style file input
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def _inline_messages(system_prompt: Optional[str], prompt: str, file_path: str) -> list:
+    return _content_messages(system_prompt, prompt, get_content(file_path))
+
+def _content_messages(system_prompt: Optional[str], prompt: str, content: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": prompt + "\n\nfile content below:\n\n" + content
+        }
+    ]
+
+def _summary_messages(system_prompt: Optional[str], prompt: str, check_logs: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": prompt + "\n\ncheck results below:\n\n" + check_logs
+        }
+    ]
+
+def _cache_key(model: str, base_url: str, system_prompt: Optional[str], prompt: str,
+               text_path: str | None, check_logs: str | None) -> str:
+    """Cache key of a request: the summary is keyed by its check log, a
+    document check by the bytes it may send: the uploaded file and, for a
+    PDF, the extracted text sent inline (which changes with a re-parse)."""
+    if text_path is None:
+        document_digest = cache.text_digest(check_logs or "")
+    else:
+        document_digest = cache.file_digest(text_path)
+        inline_path = _inline_text_path(text_path)
+        if inline_path != text_path and os.path.exists(inline_path):
+            document_digest += ":" + cache.file_digest(inline_path)
+    return cache.cache_key(model, base_url, system_prompt, prompt, document_digest)
+
+# Serializes concurrent uploads of one document, so checks share one file id
+_upload_locks: dict[str, asyncio.Lock] = {}
+
+def _file_key(base_url: str, api_key: str | None, file_path: str) -> str:
+    return providers.file_key(base_url, api_key, cache.file_digest(file_path))
+
+_FILES_ENDPOINT = re.compile(r"/files\b|\bfiles?\s+(?:api|endpoint)", re.IGNORECASE)
+
+def _is_missing_endpoint(error: Exception) -> bool:
+    """True when the provider says the files endpoint does not exist.
+
+    Auth errors (401), rate limits (429) and outages (5xx) say nothing
+    about it, and neither do network errors."""
+    if not isinstance(error, APIStatusError):
+        return False
+    if error.status_code in (404, 405, 501):
+        return True
+    return error.status_code == 400 and _FILES_ENDPOINT.search(str(error)) is not None
+
+def _note_upload_failure(base_url: str, error: Exception) -> None:
+    if _is_missing_endpoint(error) and providers.capability(base_url, "file_upload") is None:
+        providers.record_capability(base_url, "file_upload", False)
+
+def _upload_file(client, base_url: str, api_key: str | None, file_path: str) -> str:
+    """File id of ``file_path`` on the provider, uploading it on a cache miss."""
+    key = _file_key(base_url, api_key, file_path)
+    file_id = providers.cached_file_id(key)
+    if file_id is None:
+        with open(file_path, "rb") as f:
+            file_id = client.files.create(file=f, purpose="file-extract").id
+        providers.record_capability(base_url, "file_upload", True)
+        providers.remember_file_id(key, file_id)
+    return file_id
+
+async def _upload_file_async(client, base_url: str, api_key: str | None, file_path: str) -> str:
+    key = _file_key(base_url, api_key, file_path)
+    lock = _upload_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        file_id = providers.cached_file_id(key)
+        if file_id is None:
+            with open(file_path, "rb") as f:
+                file_id = (await client.files.create(file=f, purpose="file-extract")).id
+            providers.record_capability(base_url, "file_upload", True)
+            providers.remember_file_id(key, file_id)
+    return file_id
+
+def _delete_expired_files(client, base_url: str) -> None:
+    for _, file_id in providers.pop_expired_files(base_url):
+        try:
+            client.files.delete(file_id)
+        except Exception as e:
+            logger.warning("Could not delete expired file %s: %s", file_id, e)
+
+async def _delete_expired_files_async(client, base_url: str) -> None:
+    for _, file_id in providers.pop_expired_files(base_url):
+        try:
+            await client.files.delete(file_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Could not delete expired file %s: %s", file_id, e)
+
+_JSON_MODE_ERROR = re.compile(r"response_format|json_object|json mode", re.IGNORECASE)
+
+async def _chat_async(client, base_url: str, model: str, messages: list, json_mode: bool = False):
+    """One chat completion; ``json_mode`` asks for a JSON object response
+    where the provider supports it (learned per model on first use)."""
+    if json_mode and providers.capability(base_url, "json_mode", model) is not False:
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_object"},
+            )
+        except APIStatusError as e:
+            # Only a 400 about response_format says json mode is unsupported;
+            # context length or content errors are the request's own
+            if e.status_code != 400 or not _JSON_MODE_ERROR.search(str(e)):
+                raise
+            providers.record_capability(base_url, "json_mode", False, model)
+        else:
+            if providers.capability(base_url, "json_mode", model) is None:
+                providers.record_capability(base_url, "json_mode", True, model)
+            return response
+    return await client.chat.completions.create(model=model, messages=messages)
+
+def _response_text(response) -> str | None:
+    content = response.choices[0].message.content if response.choices else None
+    if isinstance(content, list):
+        text_chunks = [c.get("text", "") for c in content if isinstance(c, dict)]
+        content = "\n".join(text_chunks)
+    if isinstance(content, str):
+        return content
+    return None
 
 def _request_openai_text(
     *,
@@ -46,73 +223,182 @@ def _request_openai_text(
     prompt: str,
     system_prompt: Optional[str] = None,
     summary: bool = False,
-    check_logs: str | None = None
+    check_logs: str | None = None,
+    use_cache: bool = True
 ) -> str | None:
+    if not summary:
+        file_path = _text_path(file_path)
+    key = _cache_key(model, base_url, system_prompt, prompt, None if summary else file_path, check_logs)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     client = _build_openai_client(base_url, api_key)
     if not summary:
-        if file_path[-4:].lower() != ".pdf":
-            file_path = file_path.replace("/uploads/", "/uploads/process/").rsplit(".", 1)[0] + "__latex/full_text.txt"
-        try:
-            with open(file_path, "rb") as f:
-                raw_file = client.files.create(
-                    file=f,
-                    purpose="file-extract",
+        response = None
+        _delete_expired_files(client, base_url)
+        # Providers known to lack a file API (deepseek) get the text inline
+        if providers.capability(base_url, "file_upload") is not False:
+            try:
+                file_id = _upload_file(client, base_url, api_key, file_path)
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=_file_id_messages(system_prompt, prompt, file_id),
                 )
+            except Exception as e:  # deepseek not support file upload
+                logger.warning("Error uploading file to OpenAI: %s, upload via text in prompt", e)
+                _note_upload_failure(base_url, e)
+                providers.forget_file_id(_file_key(base_url, api_key, file_path))
+        if response is None:
             response = client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "system", "content": f'fileid://{raw_file.id}'},   # qwen-long style file input
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-            )
-        except Exception as e:  # deepseek not support file upload
-            print(f"Error uploading file to OpenAI: {e}, upload via text in prompt")
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": prompt + "\n\nfile content below:\n\n" + get_content(file_path)
-                    }
-                ],
+                messages=_inline_messages(system_prompt, prompt, file_path),
             )
     
     elif summary:
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {
-                    "role": "user",
-                    "content": prompt + "\n\ncheck results below:\n\n" + check_logs
-                }
-            ],
+            messages=_summary_messages(system_prompt, prompt, check_logs),
         )
 
-    content = response.choices[0].message.content if response.choices else None
-    if isinstance(content, list):
-        text_chunks = [c.get("text", "") for c in content if isinstance(c, dict)]
-        content = "\n".join(text_chunks)
-    if isinstance(content, str):
-        return content
-    return None
+    text = _response_text(response)
+    cache.put(key, model, base_url, text)
+    return text
+
+async def _request_openai_text_async(
+    *,
+    file_path: str | None = None,
+    base_url: str,
+    api_key: str | None,
+    model: str,
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    summary: bool = False,
+    check_logs: str | None = None,
+    content: str | None = None,
+    use_cache: bool = True,
+    json_mode: bool = False
+) -> str | None:
+    """Async twin of _request_openai_text; at most LLM_MAX_CONCURRENCY
+    requests per provider are in flight at once.
+
+    ``content`` sends that text inline instead of the document (one chunk
+    of a long paper). ``json_mode`` requests a JSON object response when the
+    provider supports it.
+    """
+    if content is not None:
+        key = _cache_key(model, base_url, system_prompt, prompt, None, content)
+    else:
+        if not summary:
+            file_path = _text_path(file_path)
+        key = _cache_key(model, base_url, system_prompt, prompt, None if summary else file_path, check_logs)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    text = await _request_uncached_async(
+        file_path=file_path, base_url=base_url, api_key=api_key, model=model,
+        prompt=prompt, system_prompt=system_prompt, summary=summary, check_logs=check_logs,
+        content=content, json_mode=json_mode,
+    )
+    cache.put(key, model, base_url, text)
+    return text
+
+async def _request_uncached_async(
+    *,
+    file_path: str | None,
+    base_url: str,
+    api_key: str | None,
+    model: str,
+    prompt: str,
+    system_prompt: Optional[str],
+    summary: bool,
+    check_logs: str | None,
+    content: str | None,
+    json_mode: bool = False
+) -> str | None:
+    client = _build_async_openai_client(base_url, api_key)
+    async with _provider_semaphore(base_url):
+        if summary:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=_summary_messages(system_prompt, prompt, check_logs),
+            )
+            return _response_text(response)
+
+        if content is not None:
+            response = await _chat_async(
+                client, base_url, model, _content_messages(system_prompt, prompt, content), json_mode,
+            )
+            return _response_text(response)
+
+        await _delete_expired_files_async(client, base_url)
+        # Providers known to lack a file API (deepseek) get the text inline
+        if providers.capability(base_url, "file_upload") is not False:
+            try:
+                file_id = await _upload_file_async(client, base_url, api_key, file_path)
+                response = await _chat_async(
+                    client, base_url, model, _file_id_messages(system_prompt, prompt, file_id), json_mode,
+                )
+                return _response_text(response)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # deepseek not support file upload
+                logger.warning("Error uploading file to OpenAI: %s, upload via text in prompt", e)
+                _note_upload_failure(base_url, e)
+                providers.forget_file_id(_file_key(base_url, api_key, file_path))
+        response = await _chat_async(
+            client, base_url, model, _inline_messages(system_prompt, prompt, file_path), json_mode,
+        )
+        return _response_text(response)
+
+async def _stream_summary_async(
+    *,
+    base_url: str,
+    api_key: str | None,
+    model: str,
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    check_logs: str,
+    use_cache: bool = True
+) -> AsyncIterator[str]:
+    """Summary text as the model writes it (a streamed completion).
+
+    Shares cache entries with the non-streamed summary: a cached summary is
+    yielded whole, and a completed stream is cached once assembled.
+    """
+    key = _cache_key(model, base_url, system_prompt, prompt, None, check_logs)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    client = _build_async_openai_client(base_url, api_key)
+    parts = []
+    async with _provider_semaphore(base_url):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=_summary_messages(system_prompt, prompt, check_logs),
+            stream=True,
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    cache.put(key, model, base_url, "".join(parts))
 
 if __name__ == "__main__":
     from app.checks.llm_based.prompts import PRESETS
-    with open("app\checks\llm_based\config.json", "r") as f:
-        config = f.read()
-    import json
-    config = json.loads(config)
+    config = get_gateway().config()
     result = _request_openai_text(
         file_path="./uploads/check_test.pdf",
-        base_url=config["api_base"],
-        api_key=config["api_key"],
-        model=config["model_name"],
+        base_url=config.api_base,
+        api_key=config.api_key,
+        model=config.model_name,
         prompt=PRESETS["anonymous"],
         system_prompt=PRESETS["system"],
     )
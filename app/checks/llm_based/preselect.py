@@ -0,0 +1,190 @@
+"""Local pre-pass that picks the parts of a paper worth an anonymity check.
+
+Most double-blind violations sit in a few places: the author block,
+acknowledgment and funding sections, footnotes, links, e-mail addresses and
+first-person self-citations. The rule-based anonymity scanner
+(rule_based/anonymity_scan.py) finds them in the merged full text in one
+pass; every hit becomes a span with surrounding context (whole lines),
+overlapping spans are merged, and only those excerpts are sent to the
+anonymity preset.
+
+Two kinds of hits:
+
+- point hits (an e-mail, a URL, "our previous work", ...) take
+  LLM_PRESELECT_CONTEXT characters on each side;
+- block hits (\\author, an Acknowledgments heading, a PDF's title block)
+  run up to LLM_PRESELECT_BLOCK characters, stopping at the next section.
+
+The hidden-prompt check of a PDF is narrowed the same way by the rendering
+level scan (rule_based/hidden_text.py), see LLM_HIDDEN_SCOPE.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import (
+    LLM_ANONYMITY_SCOPE,
+    LLM_HIDDEN_SCOPE,
+    LLM_PRESELECT_BLOCK,
+    LLM_PRESELECT_CONTEXT,
+    LLM_PRESELECT_MAX_RATIO,
+)
+from app.checks.llm_based.chunked import _find_snippet, load_document
+from app.checks.rule_based.anonymity_scan import BLOCK_KINDS, candidate_hits, context_ranges, in_context
+from app.checks.rule_based.hidden_text import HiddenTextScan, scan_hidden_text
+from app.services.source_map import DocumentLocator
+
+_SECTION_START = re.compile(
+    r"\\(?:section|chapter|subsection|begin\s*\{abstract\}|begin\s*\{document\}|maketitle)\b"
+    r"|^[ \t]*(?:\d+(?:\.\d+)*\s+[A-Z][^\n]{0,80}|abstract|references|bibliography)[ \t]*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def _line_start(text: str, pos: int) -> int:
+    return text.rfind("\n", 0, max(0, pos)) + 1
+
+
+def _line_end(text: str, pos: int) -> int:
+    end = text.find("\n", min(len(text), pos))
+    return len(text) if end == -1 else end
+
+
+def _block_end(text: str, start: int, line_end: int) -> int:
+    """End of a block starting at ``start``: the next section start after
+    its first line, capped at LLM_PRESELECT_BLOCK characters."""
+    limit = min(len(text), start + LLM_PRESELECT_BLOCK)
+    next_section = _SECTION_START.search(text, line_end, limit)
+    return next_section.start() if next_section else limit
+
+
+def preselect_spans(text: str) -> List[Dict[str, Any]]:
+    """Merged candidate spans: ``{"start", "end", "kinds"}``, sorted by start.
+
+    Text without LaTeX markup (a PDF) also gets its title block — everything
+    before the abstract — as a block, since the author list there has no
+    command to match.
+    """
+    raw: List[Tuple[int, int, str]] = []
+    if not text.lstrip().startswith("\\"):
+        raw.append((0, _block_end(text, 0, _line_end(text, 0)), "title_block"))
+    hits = candidate_hits(text)
+    ranges = context_ranges(text, hits)
+    for kind, start, end in hits:
+        # Context-only words outside their context are ordinary prose
+        if not in_context(kind, start, ranges):
+            continue
+        if kind in BLOCK_KINDS:
+            span_start = _line_start(text, start)
+            span_end = _block_end(text, start, _line_end(text, end))
+        else:
+            span_start = _line_start(text, start - LLM_PRESELECT_CONTEXT)
+            span_end = _line_end(text, end + LLM_PRESELECT_CONTEXT)
+        raw.append((span_start, span_end, kind))
+
+    merged: List[Dict[str, Any]] = []
+    for start, end, kind in sorted(raw):
+        if merged and start <= merged[-1]["end"] + 1:
+            last = merged[-1]
+            last["end"] = max(last["end"], end)
+            if kind not in last["kinds"]:
+                last["kinds"].append(kind)
+        else:
+            merged.append({"start": start, "end": end, "kinds": [kind]})
+    return merged
+
+
+def excerpts_content(text: str, spans: List[Dict[str, Any]]) -> str:
+    """Excerpts as sent to the model, each headed by its offsets."""
+    return "\n\n".join(
+        f"[excerpt {i + 1}, offset {span['start']}-{span['end']}]\n{text[span['start']:span['end']]}"
+        for i, span in enumerate(spans)
+    )
+
+
+def coverage(text: str, spans: List[Dict[str, Any]]) -> float:
+    """Fraction of ``text`` the spans cover."""
+    if not text:
+        return 0.0
+    return sum(span["end"] - span["start"] for span in spans) / len(text)
+
+
+def locate_findings(findings: Any, text: str, spans: List[Dict[str, Any]],
+                    locator: Optional[DocumentLocator] = None) -> Any:
+    """Add "excerpt", "offset" and "source" to findings quoted from the excerpts.
+
+    Non-list results (an unparsed response) are returned unchanged.
+    """
+    if not isinstance(findings, list):
+        return findings
+    for finding in findings:
+        if not isinstance(finding, dict):
+            continue
+        snippet = str(finding.get("location", "")).strip()
+        finding.setdefault("excerpt", None)
+        finding.setdefault("offset", None)
+        finding.setdefault("source", None)
+        if not snippet:
+            continue
+        for i, span in enumerate(spans):
+            offset = _find_snippet(text, snippet, span["start"], span["end"])
+            if offset >= 0:
+                finding["excerpt"] = i
+                finding["offset"] = offset
+                finding["source"] = locator.locate(offset) if locator is not None else None
+                break
+    return findings
+
+
+def plan_excerpts(file_path: str) -> Optional[Tuple[str, List[Dict[str, Any]], Optional[DocumentLocator]]]:
+    """(text, spans, locator) when the anonymity check should see excerpts
+    only; None to send the full document (LLM_ANONYMITY_SCOPE="full", no
+    candidates found, or excerpts covering more than LLM_PRESELECT_MAX_RATIO)."""
+    if LLM_ANONYMITY_SCOPE != "spans":
+        return None
+    text, _, locator = load_document(file_path)
+    spans = preselect_spans(text)
+    if not spans or coverage(text, spans) > LLM_PRESELECT_MAX_RATIO:
+        return None
+    return text, spans, locator
+
+
+def plan_hidden_spans(file_path: str, scan: Optional[HiddenTextScan] = None) -> Optional[List[Dict[str, Any]]]:
+    """Hidden-text findings of a PDF when the hidden-prompt check should be
+    gated or narrowed by them (LLM_HIDDEN_SCOPE "gate" or "spans"); an empty
+    list means the PDF has no hidden text. None to check the full document
+    ("full", or a LaTeX upload). ``scan`` is the run's shared scan, if any."""
+    if LLM_HIDDEN_SCOPE not in ("gate", "spans") or not file_path.lower().endswith(".pdf"):
+        return None
+    return scan.result() if scan is not None else scan_hidden_text(file_path)
+
+
+def hidden_spans_content(spans: List[Dict[str, Any]]) -> str:
+    """Hidden spans as sent to the model, each headed by page and reasons."""
+    return "\n\n".join(
+        f"[span {i + 1}, page {span['page']}, {', '.join(span['reasons'])}]\n{span['location']}"
+        for i, span in enumerate(spans)
+    )
+
+
+def locate_hidden_findings(findings: Any, spans: List[Dict[str, Any]]) -> Any:
+    """Add the "page" and "bbox" of the hidden span each finding quotes.
+
+    Non-list results (an unparsed response) are returned unchanged.
+    """
+    if not isinstance(findings, list):
+        return findings
+    for finding in findings:
+        if not isinstance(finding, dict):
+            continue
+        snippet = str(finding.get("location", "")).strip()
+        finding.setdefault("page", None)
+        finding.setdefault("bbox", None)
+        if not snippet:
+            continue
+        for span in spans:
+            if _find_snippet(span["location"], snippet, 0, len(span["location"])) >= 0:
+                finding["page"] = span["page"]
+                finding["bbox"] = span["bbox"]
+                break
+    return findings
@@ -0,0 +1,142 @@
+"""Persisted per-provider state: capabilities and uploaded file handles.
+
+Stored as one JSON file (LLM_PROVIDER_STATE_PATH, by default under
+UPLOAD_DIR):
+
+    {
+      "capabilities": {"<api_base>": {"file_upload": true,
+                                      "json_mode": {"<model>": false},
+                                      "checked": {"json_mode|<model>": 1700000000.0}}},
+      "files": {"<api_base>|<key digest>|<document digest>":
+                    {"id": "file-...", "created": 1700000000.0}}
+    }
+
+Capabilities are learned once and then trusted: a provider whose upload
+endpoint is missing is sent inline text directly from then on, without a
+failed round-trip per check. A missing capability is probed again after
+LLM_CAPABILITY_TTL, so a misjudged answer does not stick. An uploaded document's file id is shared by
+every check of that document until LLM_FILE_TTL expires; expired files are
+deleted on the provider side the next time that provider is used.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.config import LLM_CAPABILITY_TTL, LLM_FILE_TTL, LLM_PROVIDER_STATE_PATH
+from app.checks.llm_based.cache import text_digest
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state: Optional[Dict] = None
+
+
+def _load() -> Dict:
+    global _state
+    if _state is None:
+        try:
+            with open(LLM_PROVIDER_STATE_PATH, "r", encoding="utf-8") as f:
+                _state = json.load(f)
+        except (OSError, ValueError):
+            _state = {}
+        _state.setdefault("capabilities", {})
+        _state.setdefault("files", {})
+    return _state
+
+
+def _save() -> None:
+    directory = os.path.dirname(LLM_PROVIDER_STATE_PATH) or "."
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(_state, f, indent=2)
+        os.replace(tmp_path, LLM_PROVIDER_STATE_PATH)
+    except OSError as e:
+        logger.warning("Could not save LLM provider state: %s", e)
+
+
+# =========================================================
+# Capabilities
+# =========================================================
+
+def _checked_key(name: str, model: Optional[str]) -> str:
+    return name if model is None else f"{name}|{model}"
+
+
+def capability(api_base: str, name: str, model: Optional[str] = None) -> Optional[bool]:
+    """Recorded capability ("file_upload", or "json_mode" per model);
+    None when it has not been probed yet, or was found missing more than
+    LLM_CAPABILITY_TTL ago."""
+    with _lock:
+        record = _load()["capabilities"].get(api_base, {})
+        value = record.get(name)
+        if model is not None:
+            value = (value or {}).get(model)
+        if value is False:
+            checked = record.get("checked", {}).get(_checked_key(name, model), 0)
+            if time.time() - checked >= LLM_CAPABILITY_TTL:
+                return None
+        return value
+
+
+def record_capability(api_base: str, name: str, value: bool, model: Optional[str] = None) -> None:
+    with _lock:
+        record = _load()["capabilities"].setdefault(api_base, {})
+        if model is not None:
+            record.setdefault(name, {})[model] = value
+        else:
+            record[name] = value
+        record.setdefault("checked", {})[_checked_key(name, model)] = time.time()
+        _save()
+
+
+# =========================================================
+# Uploaded file handles
+# =========================================================
+
+def file_key(api_base: str, api_key: Optional[str], document_digest: str) -> str:
+    # Files belong to an account, so the key is part of the handle
+    return f"{api_base}|{text_digest(api_key or '')[:16]}|{document_digest}"
+
+
+def cached_file_id(key: str) -> Optional[str]:
+    """File id of a still-valid upload of this document, or None."""
+    with _lock:
+        entry = _load()["files"].get(key)
+        if entry is None or time.time() - entry["created"] >= LLM_FILE_TTL:
+            return None
+        return entry["id"]
+
+
+def remember_file_id(key: str, file_id: str) -> None:
+    with _lock:
+        _load()["files"][key] = {"id": file_id, "created": time.time()}
+        _save()
+
+
+def forget_file_id(key: str) -> None:
+    with _lock:
+        if _load()["files"].pop(key, None) is not None:
+            _save()
+
+
+def pop_expired_files(api_base: str) -> List[Tuple[str, str]]:
+    """Remove and return (key, file id) of this provider's expired uploads,
+    for the caller to delete remotely."""
+    now = time.time()
+    with _lock:
+        files = _load()["files"]
+        expired = [
+            (key, entry["id"]) for key, entry in files.items()
+            if key.startswith(api_base + "|") and now - entry["created"] >= LLM_FILE_TTL
+        ]
+        for key, _ in expired:
+            del files[key]
+        if expired:
+            _save()
+    return expired
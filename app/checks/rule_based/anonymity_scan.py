@@ -0,0 +1,327 @@
+"""Deterministic anonymity scan: no model, no network.
+
+Lexicons (funding agencies, institution words, self-referential phrases)
+and the shapes of e-mails, ORCID ids, grant numbers and personal pages are
+compiled into one regex with a named group per pattern, so the text is
+scanned in a single pass (plus a second, small pass for the case-sensitive
+acronyms, brand names and grant codes). Findings use the same fields as the
+LLM anonymity check ("type", "location", "severity", "confidence"), ranked by
+confidence.
+
+Words that are also ordinary prose, common benchmark names or citation
+text ("Laboratory", "Apple", "ARC", "Cambridge University Press") are only
+reported inside their context: the author/affiliation block for every
+institution word and company name, the acknowledgment section or a funding
+statement for short agency acronyms.
+
+The same scanner drives the LLM excerpt preselection
+(llm_based/preselect.py), which also uses the block patterns (author block,
+acknowledgment heading) to decide how much context to send.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.source_map import DocumentLocator
+
+FUNDING_AGENCIES = (
+    "National Science Foundation", "National Institutes of Health",
+    "Office of Naval Research", "Army Research Office", "Air Force Office of Scientific Research",
+    "Department of Energy", "European Research Council", "Horizon 2020", "Horizon Europe",
+    "Marie Sklodowska-Curie", "Leverhulme Trust", "Wellcome Trust",
+    "Deutsche Forschungsgemeinschaft", "National Natural Science Foundation of China",
+    "National Key R&D Program", "Simons Foundation", "Sloan Foundation", "Gates Foundation",
+    "Schmidt Futures", "Open Philanthropy",
+)
+# Collide with benchmark and dataset names ("ARC", "CREST"): funding context only
+FUNDING_ACRONYMS = (
+    "DARPA", "IARPA", "EPSRC", "UKRI", "DFG", "ANR", "NSERC", "CIFAR", "NSFC",
+    "JSPS", "KAKENHI", "JST", "CREST", "NRF", "ARC",
+)
+INSTITUTION_WORDS = (
+    "University", "Universität", "Université", "Università", "Universidad",
+    "Institute of Technology", "Institute of Science", "Max Planck Institute", "Academy of Sciences",
+)
+# Ordinary prose outside an author block ("School of thought"): affiliation context only
+AFFILIATION_WORDS = (
+    "Department of", "School of", "College of", "Faculty of", "Laboratory", "Polytechnic",
+    "Research Center", "Research Centre", "Research Lab",
+)
+# Case-sensitive, and mentioned as model or data providers throughout papers:
+# affiliation context only
+INSTITUTION_NAMES = (
+    "ETH Zurich", "EPFL", "Google Research", "Google DeepMind", "DeepMind", "Microsoft Research",
+    "Meta AI", "FAIR", "OpenAI", "Anthropic", "NVIDIA Research", "Amazon Science", "IBM Research",
+    "Apple", "Alibaba", "Tencent", "Baidu", "ByteDance", "Huawei", "Samsung Research", "Sony AI",
+)
+SELF_REFERENCES = (
+    "our previous work", "our prior work", "our earlier work", "our past work",
+    "our previous paper", "our prior paper", "our earlier paper", "our recent work",
+    "our preliminary work", "our previous study", "our prior study", "our own work",
+    "in our previous", "in our prior", "in our earlier", "as we showed in",
+    "we previously showed", "we have previously shown", "we previously proposed",
+    "we have already demonstrated", "we have previously demonstrated", "we recently proposed",
+    "we previously introduced", "extends our previous work", "extends our prior work",
+    "extends our earlier work", "the first author", "the corresponding author",
+    "the senior author", "the last author",
+)
+
+
+def _trie_regex(words, lower: bool = True) -> str:
+    """Alternation of ``words`` factored into a prefix trie.
+
+    re tries alternatives one by one, so a flat list of 80 words costs 80
+    attempts at every position; the trie form rejects a position after one
+    character-class test. Any whitespace may separate the words of a phrase.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in " ".join((word.lower() if lower else word).split()):
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        optional = "" in node
+        branches = [(r"\s+" if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if optional else body
+
+    return build(trie)
+
+
+def _lexicon(words, lower: bool = True) -> str:
+    return r"\b" + _trie_regex(words, lower) + r"\b"
+
+
+# Matched against the lowercased text, so written in lower case
+PATTERNS = {
+    "email": r"[a-z0-9._%+-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}",
+    "orcid": r"\b\d{4}-\d{4}-\d{4}-\d{3}[\dx]\b",
+    # Personal pages: ~user, github.io, sites.google.com, /people/, /staff/,
+    # ORCID profiles, repositories of a named user
+    "personal_url": (
+        r"(?:https?://|www\.)[^\s{}()\[\]<>\"'\\]*"
+        r"(?:/~|github\.io|sites\.google\.com|orcid\.org/|/people/|/staff/|/homes?/|/faculty/"
+        r"|github\.com/(?!anonymous)|gitlab\.com/(?!anonymous)|huggingface\.co/(?!datasets/anonymous))"
+        r"[^\s{}()\[\]<>\"'\\]*"
+    ),
+    "url": r"(?:https?://|www\.)[^\s{}()\[\]<>\"'\\]+",
+    "funding": (
+        r"\b(?:supported|funded|sponsored)\s+(?:in\s+part\s+)?by\b"
+        r"|\bwe\s+(?:would\s+like\s+to\s+)?(?:thank|gratefully\s+acknowledge)\b"
+        r"|\bwe\s+are\s+grateful\b"
+    ),
+    "self_reference": _lexicon(SELF_REFERENCES),
+    "institution": _lexicon(INSTITUTION_WORDS),
+    "affiliation_word": _lexicon(AFFILIATION_WORDS),
+    "footnote": r"\\(?:thanks|footnote)\s*\{",
+    # block patterns: the section that follows matters more than the match
+    "author_block": r"\\(?:author|affiliation|affil|institute|address)\b|\bpdfauthor\s*=",
+    "ack_section": (
+        r"\\begin\s*\{ack\}"
+        r"|\\(?:section|subsection|paragraph)\*?\s*\{\s*(?:acknowledg|funding|disclosure\s+of\s+funding)"
+        r"|^[ \t]*(?:\d+(?:\.\d+)*\s+)?(?:acknowledge?ments?|funding|disclosure\s+of\s+funding)\b[^\n]{0,40}$"
+        r"|^[ \t]*(?:謝辞|致谢|致謝)[ \t]*$"
+    ),
+}
+# Matched against the original text: acronyms and grant codes, where case
+# tells "DFG" or "ARC" apart from ordinary words
+CASED_PATTERNS = {
+    "grant_number": (
+        r"\b(?:[Gg]rant|[Aa]ward|[Cc]ontract|[Pp]roject)s?\s+(?:[Nn]o\.?\s*|[Nn]umber\s*|#\s*)?"
+        r"(?=[A-Z0-9/-]*\d)[A-Z0-9][A-Z0-9/-]{4,}\b"
+        r"|\b(?:IIS|CCF|CNS|DMS|OAC|ECCS|CMMI|DGE)[-\s]?\d{6,7}\b"
+        r"|\b\d{2}[A-Z]\d{5}\b"
+    ),
+    "funding_agency": _lexicon(FUNDING_AGENCIES, lower=False),
+    "funding_acronym": _lexicon(FUNDING_ACRONYMS, lower=False),
+    "institution_name": _lexicon(INSTITUTION_NAMES, lower=False),
+}
+BLOCK_KINDS = {"author_block", "ack_section"}
+# kind -> the context it must fall in to count
+CONTEXT_KINDS = {
+    # Also in nearly every bibliography ("Cambridge University Press")
+    "institution": "affiliation",
+    "affiliation_word": "affiliation",
+    "institution_name": "affiliation",
+    "funding_acronym": "funding",
+}
+# Context opened by a hit: (context, characters after the hit, characters before)
+_CONTEXT_OPENERS = {
+    "author_block": ("affiliation", 1000, 0),
+    "ack_section": ("funding", 1500, 0),
+    "funding": ("funding", 300, 150),
+}
+# Text without LaTeX markup (a PDF): the title block, before the abstract
+_PDF_TITLE_BLOCK = 1500
+_ABSTRACT = re.compile(r"^[ \t]*abstract\b", re.MULTILINE | re.IGNORECASE)
+
+# Every pattern starts at a token start, so positions inside a word are
+# rejected by one look-behind before any alternative is tried
+_TOKEN_START = r"(?<![\w@.%+\-])"
+
+
+def _scanner(patterns: Dict[str, str], flags: int = 0) -> "re.Pattern[str]":
+    alternation = "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in patterns.items())
+    return re.compile(f"{_TOKEN_START}(?:{alternation})", re.MULTILINE | flags)
+
+
+SCANNER = _scanner(PATTERNS)
+CASED_SCANNER = _scanner(CASED_PATTERNS)
+# For the rare text whose lowercase form has a different length (offsets
+# would drift), the same patterns with IGNORECASE on the original
+_SCANNER_ICASE = _scanner(PATTERNS, re.IGNORECASE)
+
+# kind -> (type, severity, confidence); None = used for preselection only
+_FINDINGS: Dict[str, Optional[Tuple[str, str, str]]] = {
+    "email": ("Author Identity Disclosure", "Major Anonymity Violation", "high"),
+    "orcid": ("Author Identity Disclosure", "Major Anonymity Violation", "high"),
+    "personal_url": ("Link/Resource Disclosure", "Major Anonymity Violation", "high"),
+    "url": None,  # every link is already reported by the link check
+    "grant_number": ("Acknowledgment/Funding", "Major Anonymity Violation", "high"),
+    "funding_agency": ("Acknowledgment/Funding", "Minor Anonymity Risk", "medium"),
+    "funding_acronym": ("Acknowledgment/Funding", "Minor Anonymity Risk", "medium"),
+    "funding": ("Acknowledgment/Funding", "Minor Anonymity Risk", "low"),
+    "self_reference": ("Self-Referential Language", "Minor Anonymity Risk", "medium"),
+    "institution": ("Institutional Disclosure", "Minor Anonymity Risk", "medium"),
+    "affiliation_word": ("Institutional Disclosure", "Minor Anonymity Risk", "medium"),
+    "institution_name": ("Institutional Disclosure", "Minor Anonymity Risk", "medium"),
+    "footnote": None,
+    "author_block": ("Author Identity Disclosure", "Major Anonymity Violation", "medium"),
+    "ack_section": ("Acknowledgment/Funding", "Minor Anonymity Risk", "medium"),
+}
+# Findings deduplicated by the matched text itself; the others by their line
+_BY_MATCH = {
+    "email", "orcid", "personal_url", "grant_number", "funding_agency", "funding_acronym",
+    "institution_name",
+}
+_ANONYMOUS_AUTHOR = re.compile(r"anonymous|anonymized|blind", re.IGNORECASE)
+_SNIPPET_CHARS = 160
+
+
+def candidate_hits(text: str) -> List[Tuple[str, int, int]]:
+    """(kind, start, end) of every pattern hit, in text order."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        hits = [(m.lastgroup, m.start(), m.end()) for m in SCANNER.finditer(lowered)]
+    else:
+        hits = [(m.lastgroup, m.start(), m.end()) for m in _SCANNER_ICASE.finditer(text)]
+    hits.extend((m.lastgroup, m.start(), m.end()) for m in CASED_SCANNER.finditer(text))
+    hits.sort(key=lambda hit: hit[1])
+    return hits
+
+
+def context_ranges(text: str, hits: List[Tuple[str, int, int]]) -> Dict[str, List[Tuple[int, int]]]:
+    """(start, end) ranges of each context ("affiliation", "funding") that
+    the context-only kinds must fall in."""
+    ranges: Dict[str, List[Tuple[int, int]]] = {"affiliation": [], "funding": []}
+    if not text.lstrip().startswith("\\"):
+        abstract = _ABSTRACT.search(text, 0, _PDF_TITLE_BLOCK)
+        ranges["affiliation"].append((0, abstract.start() if abstract else _PDF_TITLE_BLOCK))
+    for kind, start, end in hits:
+        opener = _CONTEXT_OPENERS.get(kind)
+        if opener is not None:
+            context, after, before = opener
+            ranges[context].append((max(0, start - before), end + after))
+    return ranges
+
+
+def in_context(kind: str, start: int, ranges: Dict[str, List[Tuple[int, int]]]) -> bool:
+    """False for a context-only hit outside its context."""
+    context = CONTEXT_KINDS.get(kind)
+    return context is None or any(lo <= start < hi for lo, hi in ranges[context])
+
+
+def _snippet(text: str, start: int, end: int) -> str:
+    """The matched line(s), trimmed around the match."""
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    line_end = len(text) if line_end == -1 else line_end
+    lo = max(line_start, start - _SNIPPET_CHARS // 2)
+    hi = min(line_end, end + _SNIPPET_CHARS // 2)
+    return " ".join(text[lo:hi].split())
+
+
+def anonymity_scan_check(text: str, locator: Optional[DocumentLocator] = None) -> Dict[str, Any]:
+    """Scan ``text`` for anonymity violations without calling a model.
+
+    Args:
+        text: merged full text of the paper
+        locator: maps text offsets to "file.tex:line" / "page N"; when given,
+            every finding carries the "locations" it occurs at
+
+    Returns:
+        Dict with check_type "anonymity_scan" and a confidence-ranked list of
+        findings, or a message when nothing is found.
+    """
+    findings: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    offsets: Dict[Tuple[str, str], List[int]] = {}
+    hits = candidate_hits(text)
+    ranges = context_ranges(text, hits)
+    for kind, start, end in hits:
+        spec = _FINDINGS.get(kind)
+        if spec is None or not in_context(kind, start, ranges):
+            continue
+        if kind == "author_block" and _ANONYMOUS_AUTHOR.search(text, end, end + 200):
+            continue
+        finding_type, severity, confidence = spec
+        match = text[start:end].strip().rstrip(".,;:")
+        snippet = _snippet(text, start, end)
+        key = (finding_type, " ".join((match if kind in _BY_MATCH else snippet).lower().split()))
+        if key not in findings:
+            findings[key] = {
+                "type": finding_type,
+                "location": snippet,
+                "match": match,
+                "severity": severity,
+                "confidence": confidence,
+            }
+        offsets.setdefault(key, []).append(start)
+
+    if not findings:
+        return {
+            "check_type": "anonymity_scan",
+            "results": "No anonymity issues found by the rule-based scan.",
+        }
+
+    details = list(findings.values())
+    if locator is not None:
+        for key, entry in findings.items():
+            entry["locations"] = locator.locate_all(offsets[key])
+
+    order = {"high": 0, "medium": 1, "low": 2, "unknown": 3,}
+    details = sorted(details, key=lambda x: order.get(x["confidence"], 99))
+    return {
+        "check_type": "anonymity_scan",
+        "results": details,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Institution words count in the author block, not in the references
+    sample = (
+        "\\title{A Study}\n"
+        "\\author{Jane Doe \\\\ Stanford University}\n"
+        "\\begin{document}\n"
+        + "Body text. " * 200
+        + "\n\\begin{thebibliography}{9}\n"
+        "\\bibitem{a} A. Author. Book. Cambridge University Press, 2020.\n"
+        "\\bibitem{b} B. Author. Thesis. Massachusetts Institute of Technology, 2019.\n"
+        "\\end{thebibliography}\n"
+    )
+    results = anonymity_scan_check(sample)["results"]
+    institutions = [f["location"] for f in results if f["type"] == "Institutional Disclosure"]
+    for location in institutions:
+        print(location)
+    ok = (
+        any("Stanford" in location for location in institutions)
+        and not any("Press" in location or "Massachusetts" in location for location in institutions)
+    )
+    print("context OK" if ok else "context FAILED")
+    sys.exit(0 if ok else 1)
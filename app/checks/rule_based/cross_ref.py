@@ -1,55 +1,31 @@
 import os
 import json
-import re
 from typing import Dict, List, Set
 
+from app.services.latex_tokens import Token, arg_text, commands, env_spans, labels_in_spans, load_tokens
+from app.services.source_map import DocumentLocator, load_locator
 
-def _read_text(path: str) -> str:
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception:
-        with open(path, "r", encoding="latin-1", errors="ignore") as f:
-            return f.read()
-
-
-def _strip_comments(text: str) -> str:
-    cleaned = []
-    for line in text.splitlines():
-        line = re.sub(r"(?<!\\)%.*", "", line)
-        cleaned.append(line)
-    return "\n".join(cleaned)
 
+def _extract_refs(text: str, tokens: List[Token]) -> Set[str]:
+    return {arg_text(text, t) for t in commands(tokens, ("ref", "eqref")) if t.args}
 
-def _extract_refs(text: str) -> Set[str]:
-    pattern = re.compile(r"\\(ref|eqref)\s*\{([^}]+)\}")
-    refs = set()
-    for match in pattern.finditer(text):
-        refs.add(match.group(2).strip())
-    return refs
 
+def _extract_labels(text: str, tokens: List[Token]) -> Set[str]:
+    return {arg_text(text, t) for t in commands(tokens, ("label",)) if t.args}
 
-def _extract_labels(text: str) -> Set[str]:
-    pattern = re.compile(r"\\label\s*\{([^}]+)\}")
-    labels = set()
-    for match in pattern.finditer(text):
-        labels.add(match.group(1).strip())
-    return labels
 
-
-def _extract_env_blocks(text: str, env_name: str) -> List[str]:
-    pattern = re.compile(
-        r"\\begin\{" + re.escape(env_name) + r"\}(.*?)\\end\{" + re.escape(env_name) + r"\}",
-        re.DOTALL,
-    )
-    return [m.group(1) for m in pattern.finditer(text)]
-
-
-def _labels_in_blocks(blocks: List[str]) -> Set[str]:
-    labels = set()
-    for block in blocks:
-        labels.update(_extract_labels(block))
-    return labels
+def _locations(text: str, tokens: List[Token], names, keys: List[str],
+               locator: DocumentLocator | None) -> Dict[str, List[str]]:
+    """key -> source locations of the ``names`` commands whose argument is key."""
+    if locator is None or not keys:
+        return {}
+    wanted = set(keys)
+    offsets: Dict[str, List[int]] = {}
+    for token in commands(tokens, names):
+        key = arg_text(text, token)
+        if key in wanted:
+            offsets.setdefault(key, []).append(token.start)
+    return {key: locator.locate_all(offsets.get(key, [])) for key in keys}
 
 
 def _load_full_text_path(proj_path: str) -> str | None:
@@ -85,22 +61,25 @@ def cross_ref_check(file_path: str, proj_path: str) -> Dict:
             "results": "summary.json/full_text not found in process directory"
         }
 
-    raw_text = _read_text(full_text_path)
-    text = _strip_comments(raw_text)
+    # Token stream cached by the LaTeX parser (comments are already gone)
+    text, tokens = load_tokens(full_text_path)
 
-    refs = _extract_refs(text)
-    labels = _extract_labels(text)
+    refs = _extract_refs(text, tokens)
+    labels = _extract_labels(text, tokens)
 
     invalid_refs = sorted(refs - labels)
 
-    figure_blocks = _extract_env_blocks(text, "figure")
-    table_blocks = _extract_env_blocks(text, "table")
-    fig_labels = _labels_in_blocks(figure_blocks)
-    table_labels = _labels_in_blocks(table_blocks)
+    fig_labels = labels_in_spans(text, tokens, env_spans(tokens, "figure"))
+    table_labels = labels_in_spans(text, tokens, env_spans(tokens, "table"))
     fig_table_labels = fig_labels | table_labels
 
     unreferenced = sorted(fig_table_labels - refs)
 
+    # Where each finding sits in the original sources ("sec/2.tex:14")
+    locator = load_locator(proj_path)
+    invalid_locations = _locations(text, tokens, ("ref", "eqref"), invalid_refs, locator)
+    unreferenced_locations = _locations(text, tokens, ("label",), unreferenced, locator)
+
     passed = len(invalid_refs) == 0 and len(unreferenced) == 0
 
     return {
@@ -108,10 +87,12 @@ def cross_ref_check(file_path: str, proj_path: str) -> Dict:
         "results": [
                 {
                     "invalid_refs": invalid_refs,
+                    "locations": invalid_locations,
                     "confidence": "high"
                 },
                 {
                     "unreferenced_fig_table_labels": unreferenced,
+                    "locations": unreferenced_locations,
                     "confidence": "medium"
                 },
                 {
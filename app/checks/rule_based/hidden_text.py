@@ -0,0 +1,203 @@
+"""Rendering-level hidden text detection for PDFs.
+
+Prompt injections are usually hidden with rendering tricks rather than
+words, and those tricks are visible in the PDF's own drawing data. One
+walk over each page's text trace (every text span with its colour,
+opacity, render mode, font size, bbox and paint order) flags:
+
+- white or near-white text (unless painted over a dark filled shape);
+- font sizes under 1pt;
+- text outside the visible page, fully or mostly;
+- fully transparent text, and invisible text (render mode 3);
+- text painted over later by an image.
+
+Consecutive flagged spans with the same reasons are reported as one
+finding with its page and bbox. The whole scan takes milliseconds per
+page, so it also gates or narrows the LLM hidden-prompt check
+(LLM_HIDDEN_SCOPE, llm_based/preselect.py). Within one run both checks
+share a single scan (HiddenTextScan).
+"""
+
+import copy
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+TINY_FONT_SIZE = 1.0         # points
+WHITE_LEVEL = 0.9            # every RGB channel at least this bright
+DARK_FILL_LEVEL = 0.5        # a fill this dark makes white text legitimate
+MIN_OPACITY = 0.05
+OFF_PAGE_FRACTION = 0.5      # share of the span outside the page
+UNDER_IMAGE_FRACTION = 0.8   # share of the span covered by a later image
+
+_IMAGE_KINDS = ("fill-image", "fill-imgmask")
+_WORD_GAP = 0.15             # horizontal gap, in font sizes, read as a space
+_SNIPPET_CHARS = 200
+
+_HIGH_REASONS = {"outside page", "transparent", "tiny font"}
+
+
+Box = Tuple[float, float, float, float]
+
+
+def _area(box: Box) -> float:
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+def _covered_fraction(box: Box, cover: Box) -> float:
+    """Share of ``box`` inside ``cover`` (plain tuples: fitz.Rect arithmetic
+    costs more than the rest of the scan)."""
+    area = _area(box)
+    if area <= 0:
+        inside = cover[0] <= box[0] <= cover[2] and cover[1] <= box[1] <= cover[3]
+        return 1.0 if inside else 0.0
+    overlap = (max(box[0], cover[0]), max(box[1], cover[1]),
+               min(box[2], cover[2]), min(box[3], cover[3]))
+    return _area(overlap) / area
+
+
+def _span_text(span: Dict[str, Any]) -> str:
+    """Text of a trace span. Words positioned apart without a space glyph
+    (common for injected text) get a space back."""
+    gap = _WORD_GAP * span.get("size", 0)
+    parts = []
+    previous_end = None
+    for code, _, _, bbox in span.get("chars", ()):
+        if previous_end is not None and bbox[0] - previous_end > gap and code != 32:
+            parts.append(" ")
+        parts.append(chr(code))
+        previous_end = bbox[2]
+    return "".join(parts)
+
+
+def _is_white(color: Tuple[float, ...]) -> bool:
+    return bool(color) and all(c >= WHITE_LEVEL for c in color[:3])
+
+
+def _dark_fill_below(box: Box, seqno: int, drawings: List[Dict[str, Any]]) -> bool:
+    """True when a dark filled shape painted before ``seqno`` covers ``box``."""
+    for drawing in drawings:
+        fill = drawing.get("fill")
+        if not fill or drawing.get("seqno", 0) >= seqno:
+            continue
+        if max(fill[:3]) < DARK_FILL_LEVEL and _covered_fraction(box, tuple(drawing["rect"])) >= 0.8:
+            return True
+    return False
+
+
+def _span_reasons(page: fitz.Page, span: Dict[str, Any], page_box: Box,
+                  images: List[Tuple[int, Box]], drawings_cache: Dict[str, Any]) -> List[str]:
+    box = span["bbox"]
+    seqno = span.get("seqno", 0)
+    reasons = []
+    if span.get("type") == 3:
+        reasons.append("invisible render mode")
+    if span.get("opacity", 1.0) < MIN_OPACITY:
+        reasons.append("transparent")
+    if span.get("size", 0) < TINY_FONT_SIZE:
+        reasons.append("tiny font")
+    if 1.0 - _covered_fraction(box, page_box) >= OFF_PAGE_FRACTION:
+        reasons.append("outside page")
+    if _is_white(span.get("color") or ()):
+        # Only look up the page's drawings when there is white text at all
+        if "drawings" not in drawings_cache:
+            drawings_cache["drawings"] = page.get_drawings()
+        if not _dark_fill_below(box, seqno, drawings_cache["drawings"]):
+            reasons.append("white text")
+    if any(order > seqno and _covered_fraction(box, image) >= UNDER_IMAGE_FRACTION
+           for order, image in images):
+        reasons.append("under image")
+    return reasons
+
+
+def _finding(page_number: int, reasons: List[str], text: str, box: Box) -> Dict[str, Any]:
+    high = len(reasons) > 1 or any(r in _HIGH_REASONS for r in reasons)
+    return {
+        "type": "Formatting-Based Concealment",
+        "location": " ".join(text.split()),
+        "reasons": reasons,
+        "page": page_number,
+        "bbox": [round(v, 1) for v in box],
+        "severity": "Suspicious Pattern Detected",
+        "confidence": "high" if high else "medium",
+    }
+
+
+def scan_hidden_text(pdf_path: str) -> List[Dict[str, Any]]:
+    """Every hidden-text finding of the PDF, in page order, with the
+    complete hidden text as "location"."""
+    findings: List[Dict[str, Any]] = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            page_number = page.number + 1
+            page_box = tuple(page.rect)
+            images = [
+                (order, tuple(rect))
+                for order, (kind, rect) in enumerate(page.get_bboxlog())
+                if kind in _IMAGE_KINDS
+            ]
+            drawings_cache: Dict[str, Any] = {}
+            current: Optional[Dict[str, Any]] = None
+            last_seqno = None
+            for span in page.get_texttrace():
+                text = _span_text(span)
+                if not text.strip():
+                    continue
+                reasons = _span_reasons(page, span, page_box, images, drawings_cache)
+                if not reasons:
+                    current = None
+                    continue
+                seqno = span.get("seqno", 0)
+                # Merge runs of consecutive spans hidden the same way
+                if (current is not None and current["reasons"] == reasons
+                        and last_seqno is not None and seqno - last_seqno <= 1):
+                    box = current["box"]
+                    current["text"] += " " + text
+                    current["box"] = (min(box[0], span["bbox"][0]), min(box[1], span["bbox"][1]),
+                                      max(box[2], span["bbox"][2]), max(box[3], span["bbox"][3]))
+                else:
+                    current = {"page": page_number, "reasons": reasons, "text": text, "box": span["bbox"]}
+                    findings.append(current)
+                last_seqno = seqno
+    return [_finding(f["page"], f["reasons"], f["text"], f["box"]) for f in findings]
+
+
+class HiddenTextScan:
+    """scan_hidden_text of one PDF, run at most once and shared by the
+    checks of a run. The first caller runs the scan in its own thread (the
+    scan takes milliseconds per page) while later callers wait for it;
+    every caller gets its own copy of the findings."""
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = pdf_path
+        self._lock = threading.Lock()
+        self._findings: Optional[List[Dict[str, Any]]] = None
+
+    def result(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._findings is None:
+                self._findings = scan_hidden_text(self.pdf_path)
+        return copy.deepcopy(self._findings)
+
+
+def hidden_text_check(file_path: str, scan: Optional[HiddenTextScan] = None) -> Dict[str, Any]:
+    """Flag text a reader cannot see but a text extractor (or an LLM) can."""
+    if file_path[-4:].lower() != ".pdf":
+        return {
+            "check_type": "hidden_text",
+            "results": "NOT a PDF file",
+        }
+    findings = scan.result() if scan is not None else scan_hidden_text(file_path)
+    if not findings:
+        return {
+            "check_type": "hidden_text",
+            "results": "No hidden text found in the PDF rendering.",
+        }
+    for finding in findings:
+        finding["location"] = finding["location"][:_SNIPPET_CHARS]
+    order = {"high": 0, "medium": 1, "low": 2, "unknown": 3,}
+    return {
+        "check_type": "hidden_text",
+        "results": sorted(findings, key=lambda x: order.get(x["confidence"], 99)),
+    }
@@ -1,4 +1,5 @@
 from PIL import Image
+import json
 import os
 
 
@@ -31,8 +32,68 @@ def estimate_image_confidence(width: int, height: int) -> str:
         return "low"
 
 
+def _pdf_image_manifest(path):
+    """Image manifest from a PDF parse (summary.json), or None.
+
+    PDF images are not extracted at parse time; their dimensions come from
+    the xref table, so no pixels need to be decoded here.
+    """
+    summary_path = os.path.join(path, "summary.json")
+    if not os.path.exists(summary_path):
+        return None
+    try:
+        with open(summary_path, "r", encoding="utf-8") as f:
+            images = json.load(f).get("images")
+    except Exception:
+        return None
+    if not isinstance(images, list) or not all(isinstance(img, dict) and "xref" in img for img in images):
+        return None
+    return images
+
+
+def _latex_image_locations(path):
+    """resolved image path -> ["sec/4.tex:17", ...] from a LaTeX parse's summary.json."""
+    summary_path = os.path.join(path, "summary.json")
+    try:
+        with open(summary_path, "r", encoding="utf-8") as f:
+            images = json.load(f).get("images") or []
+    except Exception:
+        return {}
+    locations = {}
+    for img in images:
+        if isinstance(img, dict) and img.get("resolved_path") and img.get("location"):
+            key = os.path.normpath(img["resolved_path"])
+            locations.setdefault(key, []).append(img["location"])
+    return locations
+
+
+def _page_label(pages):
+    """[1, 2, 3, 7] -> "pages 1-3, 7"."""
+    runs = []
+    for p in pages:
+        if runs and p == runs[-1][1] + 1:
+            runs[-1][1] = p
+        else:
+            runs.append([p, p])
+    spans = [str(a) if a == b else f"{a}-{b}" for a, b in runs]
+    return ("page " if len(pages) == 1 else "pages ") + ", ".join(spans)
+
+
+def _risk_entry(filename, width, height):
+    confidence = estimate_image_confidence(width, height)
+    return {
+        "filename": filename,
+        "width × height": f"{width} × {height}",
+        "risk": "Image may be too low resolution for clear visibility in the paper." if confidence == "high" else "Image resolution seems acceptable." if confidence == "medium" else "Image resolution is likely sufficient.",
+        "confidence": confidence
+    }
+
+
 def image_quality_check(path):
-    """Scan directory for image files and assess resolution risk.
+    """Assess image resolution risk for a process directory.
+
+    PDF parses are assessed from their image manifest; other directories
+    (LaTeX sources) are scanned for image files.
 
     Args:
         path: Directory path to scan
@@ -69,29 +130,34 @@ def image_quality_check(path):
             ]
         }
     
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            if file.lower().endswith(image_extensions):
-                file_path = os.path.join(root, file)
-                
-                try:
-                    with Image.open(file_path) as im:
-                        width, height = im.size
-                    
-                    results.append({
-                        "filename": file,
-                        "width × height": f"{width} × {height}",
-                        "risk": "Image may be too low resolution for clear visibility in the paper." if estimate_image_confidence(width, height) == "high" else "Image resolution seems acceptable." if estimate_image_confidence(width, height) == "medium" else "Image resolution is likely sufficient.",
-                        "confidence": estimate_image_confidence(width, height)
-                    })
-                except Exception as e:
-                    results.append({
-                        "filename": file,
-                        "error": str(e)
-                    })
+    manifest = _pdf_image_manifest(path)
+    if manifest is not None:
+        for img in manifest:
+            label = f"xref {img['xref']} ({_page_label(img.get('pages', []))})"
+            results.append(_risk_entry(label, img["width"], img["height"]))
+    else:
+        locations = _latex_image_locations(path)
+        for root, dirs, files in os.walk(path):
+            for file in files:
+                if file.lower().endswith(image_extensions):
+                    file_path = os.path.join(root, file)
+
+                    try:
+                        with Image.open(file_path) as im:
+                            width, height = im.size
+
+                        entry = _risk_entry(file, width, height)
+                        if os.path.normpath(file_path) in locations:
+                            entry["locations"] = locations[os.path.normpath(file_path)]
+                        results.append(entry)
+                    except Exception as e:
+                        results.append({
+                            "filename": file,
+                            "error": str(e)
+                        })
     
     order = {"high": 0, "medium": 1, "low": 2, "unknown": 3,}
-    results = sorted(results, key=lambda x: order.get(x["confidence"], 99))
+    results = sorted(results, key=lambda x: order.get(x.get("confidence"), 99))
 
     if len(results) == 0:
         return {
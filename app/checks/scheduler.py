@@ -0,0 +1,139 @@
+"""Dependency-aware, concurrent check execution.
+
+Every check is declared once as a CheckSpec: which context values it reads,
+its cost class and which checks it depends on. run_scheduled starts every
+check whose dependencies are done, so independent checks overlap and the
+wall time is that of the longest chain instead of the sum.
+
+Cost classes:
+  cpu  - pure-Python parsing/regex work; runs on the worker process pool
+         when there is more than one worker, else on the thread pool
+  io   - file reads and library calls that release the GIL
+  llm  - remote model calls (I/O bound, long timeouts)
+
+Checks written as coroutine functions (the LLM checks) run on the shared
+asyncio loop instead of occupying a thread, and a timeout cancels them.
+
+A check that raises or times out is reported like other failed checks
+(``{"check_type": ..., "results": "<error>"}``) and never takes the others
+down; its dependents still run and see that result. A cpu check that times
+out on the process pool retires that pool (workers.recycle_check_pool):
+later checks start on a fresh pool and the stuck worker is terminated once
+every check already running could have timed out. Python cannot kill a
+running thread, so a timed-out thread or io check keeps running in the
+background, but its result is discarded.
+"""
+
+import inspect
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.config import CHECK_TIMEOUT, LLM_CHECK_TIMEOUT, PDF_PARSE_WORKERS
+from app.services.workers import get_check_pool, get_thread_pool, recycle_check_pool, submit_coroutine
+
+COST_CPU = "cpu"
+COST_IO = "io"
+COST_LLM = "llm"
+
+# Input name that receives the results of the check's dependencies, in
+# registry order
+DEP_RESULTS = "dep_results"
+
+
+class CheckSpec(NamedTuple):
+    name: str                       # key used in the "checks" request field
+    check_type: str                 # check_type of the result it reports
+    func: Callable[..., Dict]       # module-level (picklable for workers) or async
+    inputs: Tuple[str, ...]         # context keys passed positionally, or DEP_RESULTS
+    cost: str = COST_IO
+    deps: Tuple[str, ...] = ()      # names of checks whose results it needs
+    timeout: Optional[float] = None
+
+    def time_limit(self) -> float:
+        if self.timeout is not None:
+            return self.timeout
+        return LLM_CHECK_TIMEOUT if self.cost == COST_LLM else CHECK_TIMEOUT
+
+
+def _error_result(spec: CheckSpec, message: str) -> Dict:
+    return {"check_type": spec.check_type, "results": f"{spec.name} check failed: {message}"}
+
+
+def _in_process_pool(spec: CheckSpec) -> bool:
+    return not inspect.iscoroutinefunction(spec.func) and spec.cost == COST_CPU and PDF_PARSE_WORKERS > 1
+
+
+def _submit(spec: CheckSpec, args: List[Any]) -> Future:
+    if inspect.iscoroutinefunction(spec.func):
+        return submit_coroutine(spec.func(*args))
+    if _in_process_pool(spec):
+        return get_check_pool().submit(spec.func, *args)
+    return get_thread_pool().submit(spec.func, *args)
+
+
+def run_scheduled(registry: Sequence[CheckSpec], enabled: set, context: Dict[str, Any]) -> List[Dict]:
+    """Run the enabled checks of ``registry`` concurrently.
+
+    Dependencies on checks that are not enabled are ignored. Results come
+    back in registry order, whatever order the checks finish in.
+    """
+    specs = [spec for spec in registry if spec.name in enabled]
+    names = {spec.name for spec in specs}
+    deps = {spec.name: [d for d in spec.deps if d in names] for spec in specs}
+    results: Dict[str, Dict] = {}
+    running: Dict[Future, Tuple[CheckSpec, float]] = {}
+    pending = list(specs)
+
+    def start_ready() -> None:
+        # Loops because a check that fails to start can unblock its dependents
+        progressed = True
+        while progressed:
+            progressed = False
+            for spec in list(pending):
+                if any(d not in results for d in deps[spec.name]):
+                    continue
+                pending.remove(spec)
+                progressed = True
+                _start(spec)
+
+    def _start(spec: CheckSpec) -> None:
+        args = []
+        for key in spec.inputs:
+            if key == DEP_RESULTS:
+                args.append([results[s.name] for s in specs if s.name in deps[spec.name]])
+            else:
+                args.append(context.get(key))
+        try:
+            future = _submit(spec, args)
+        except Exception as e:
+            results[spec.name] = _error_result(spec, str(e))
+            return
+        running[future] = (spec, time.monotonic() + spec.time_limit())
+
+    start_ready()
+    while running:
+        now = time.monotonic()
+        next_deadline = min(deadline for _, deadline in running.values())
+        done, _ = wait(list(running), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            spec, _ = running.pop(future)
+            try:
+                results[spec.name] = future.result()
+            except Exception as e:
+                results[spec.name] = _error_result(spec, f"{type(e).__name__}: {e}")
+        now = time.monotonic()
+        for future, (spec, deadline) in list(running.items()):
+            if deadline <= now:
+                running.pop(future)
+                if not future.cancel() and _in_process_pool(spec):
+                    # Already running in a worker: the only way to stop it
+                    recycle_check_pool(grace=CHECK_TIMEOUT)
+                results[spec.name] = _error_result(spec, f"timed out after {spec.time_limit():g}s")
+        start_ready()
+
+    # Only reachable with a dependency cycle; report instead of hanging
+    for spec in pending:
+        results[spec.name] = _error_result(spec, "unresolved dependencies")
+
+    return [results[spec.name] for spec in specs]
@@ -1,7 +1,59 @@
-import os
-
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
-MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 1024 * 1024))
-
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 1024 * 1024))
+# PDF extraction backend: "pymupdf" (single pass) or "pdfplumber" (legacy)
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pymupdf")
+# Page-parallel PDF parsing: worker processes, and the page count below which
+# parsing stays serial in the request process
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+# LaTeX ZIP bounds: entries in the archive, and total uncompressed bytes of
+# the members actually extracted
+MAX_ZIP_MEMBERS = int(os.getenv("MAX_ZIP_MEMBERS", 10000))
+MAX_ZIP_EXTRACT_SIZE = int(os.getenv("MAX_ZIP_EXTRACT_SIZE", 200 * 1024 * 1024))
+# Check scheduler: threads for I/O and LLM checks, and per-check timeouts
+# (seconds) for local checks and LLM calls
+CHECK_THREADS = int(os.getenv("CHECK_THREADS", 8))
+CHECK_TIMEOUT = float(os.getenv("CHECK_TIMEOUT", 120))
+LLM_CHECK_TIMEOUT = float(os.getenv("LLM_CHECK_TIMEOUT", 600))
+# Concurrent requests allowed per LLM provider (api_base)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+# On-disk LLM response cache: on/off, SQLite file, and size cap (bytes of
+# stored responses) before least recently used entries are evicted
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(UPLOAD_DIR, "llm_cache.sqlite"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Provider capabilities and uploaded file ids (JSON), and how long (seconds)
+# an uploaded document is reused before it is deleted and uploaded again
+LLM_PROVIDER_STATE_PATH = os.getenv("LLM_PROVIDER_STATE_PATH", os.path.join(UPLOAD_DIR, "llm_providers.json"))
+LLM_FILE_TTL = float(os.getenv("LLM_FILE_TTL", 24 * 3600))
+# A capability found missing (no file API, no JSON mode) is probed again
+# after this many seconds
+LLM_CAPABILITY_TTL = float(os.getenv("LLM_CAPABILITY_TTL", 24 * 3600))
+# Long papers sent inline are split into chunks of about this many tokens:
+# "auto" (when the provider takes no file uploads), "always" or "off"
+LLM_CHUNK_MODE = os.getenv("LLM_CHUNK_MODE", "auto")
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", 24000))
+# Anonymity check input: "spans" sends only the excerpts a local pre-pass
+# selects (context characters around each hit, longer blocks for author and
+# acknowledgment sections); the full document is sent instead when nothing is
+# found or the excerpts would cover more than LLM_PRESELECT_MAX_RATIO of it.
+# "full" always sends the whole document.
+LLM_ANONYMITY_SCOPE = os.getenv("LLM_ANONYMITY_SCOPE", "spans")
+LLM_PRESELECT_CONTEXT = int(os.getenv("LLM_PRESELECT_CONTEXT", 300))
+LLM_PRESELECT_BLOCK = int(os.getenv("LLM_PRESELECT_BLOCK", 1500))
+LLM_PRESELECT_MAX_RATIO = float(os.getenv("LLM_PRESELECT_MAX_RATIO", 0.5))
+# Hidden-prompt check input for PDFs, driven by the rendering-level hidden
+# text scan: "full" sends the whole document, "gate" sends it only when the
+# scan flags something, "spans" sends only the flagged spans. With "gate" and
+# "spans", a PDF without hidden text costs no LLM call.
+LLM_HIDDEN_SCOPE = os.getenv("LLM_HIDDEN_SCOPE", "full")
+# When both the anonymity and the hidden-prompt checks run and the hidden
+# check needs the whole document, answer both with one combined request
+# (one upload or inline copy of the paper instead of two). This replaces the
+# anonymity excerpts, which only save tokens when sent on their own.
+LLM_MERGE_CHECKS = os.getenv("LLM_MERGE_CHECKS", "1").lower() not in ("0", "false", "no")
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
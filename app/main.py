@@ -1,25 +1,31 @@
-import os
-import sys
-from flask import Flask, render_template
-ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if ROOT not in sys.path:
-    sys.path.insert(0, ROOT)
-
-from app.api import upload as upload_routes
-from app.api import check as check_routes
-
-TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
-
-app = Flask(__name__, template_folder=TEMPLATES_DIR)
-
-upload_routes.register_routes(app)
-check_routes.register_check_routes(app)
-
-
-@app.route("/")
-def index():
-    return render_template("index.html")
-
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+import os
+import sys
+from flask import Flask, render_template
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.api import upload as upload_routes
+from app.api import check as check_routes
+from app.config import PDF_PARSE_WORKERS
+from app.services.workers import warm_process_pool
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+app = Flask(__name__, template_folder=TEMPLATES_DIR)
+
+upload_routes.register_routes(app)
+check_routes.register_check_routes(app)
+
+
+@app.route("/")
+def index():
+    return render_template("index.html")
+
+
+if __name__ == "__main__":
+    # The debug reloader runs this block in a watcher process as well; only
+    # the serving child (WERKZEUG_RUN_MAIN set) uses the workers
+    if PDF_PARSE_WORKERS > 1 and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_process_pool()
+    app.run(host="0.0.0.0", port=8000, debug=True)
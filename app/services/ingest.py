@@ -1,24 +1,156 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
 from app.config import UPLOAD_DIR, MAX_UPLOAD_SIZE
 
 
 def save_upload(file):
+    """Stream an upload into the content-addressed store.
+
+    The file is hashed while it is copied and stored as
+    UPLOAD_DIR/<sha256>.<ext>, so identical submissions share one copy
+    (and one process directory) regardless of their original name.
+
+    Returns (dest_path, stored_name, digest).
+    """
     filename = file.filename
     filename = filename.replace(" ", "_")
-    dest_path = os.path.join(UPLOAD_DIR, filename)
+    ext = os.path.splitext(filename)[1].lower()
+    digest = hashlib.sha256()
     size = 0
-    with open(dest_path, "wb") as f:
-        while True:
-            chunk = file.stream.read(1024 * 1024)
-            if not chunk:
-                break
-            size += len(chunk)
-            if size > MAX_UPLOAD_SIZE:
-                f.close()
-                try:
-                    os.remove(dest_path)
-                except Exception:
-                    pass
-                raise ValueError("File too large")
-            f.write(chunk)
-    return dest_path, filename
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = file.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise ValueError("File too large")
+                digest.update(chunk)
+                f.write(chunk)
+        stored_name = digest.hexdigest() + ext
+        dest_path = os.path.join(UPLOAD_DIR, stored_name)
+        if os.path.exists(dest_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+    return dest_path, stored_name, digest.hexdigest()
+
+
+def process_dir_for(path, filename, kind):
+    """Process directory for an upload: <upload dir>/process/<basename>__<kind>."""
+    base_dir = os.path.dirname(path)
+    basename = os.path.splitext(filename)[0].replace(" ", "_")  # Sanitize for directory name
+    return os.path.join(base_dir, "process", f"{basename}__{kind}")
+
+
+# Serializes the rename pairs of concurrent publishes
+_publish_lock = threading.Lock()
+
+
+def staging_dir_for(process_dir):
+    """Fresh private directory next to ``process_dir`` to parse into.
+
+    Parsing in place would let a re-parse with other options (or a
+    concurrent upload of the same file) overwrite the files another request
+    is reading; publish_dir() swaps the finished parse in instead.
+    """
+    parent = os.path.dirname(process_dir)
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(dir=parent, prefix="." + os.path.basename(process_dir) + ".")
+
+
+def publish_dir(staging_dir, process_dir):
+    """Move a finished parse from ``staging_dir`` to ``process_dir``,
+    replacing any earlier parse there.
+
+    A non-empty directory cannot be replaced in one rename, so the old one
+    is renamed aside first and removed afterwards; readers never see a
+    half-written parse, only (briefly) no parse at all.
+    """
+    old_dir = None
+    with _publish_lock:
+        if os.path.exists(process_dir):
+            old_dir = tempfile.mkdtemp(dir=os.path.dirname(process_dir), prefix="." + os.path.basename(process_dir) + ".old.")
+            os.replace(process_dir, os.path.join(old_dir, "parse"))
+        os.replace(staging_dir, process_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_cached_parse(process_dir, parse_options):
+    """Return the stored summary when process_dir already holds a parse made
+    with the same options, else None.
+
+    The returned dict carries "cached": True so callers can report the reuse.
+    """
+    summary_path = os.path.join(process_dir, "summary.json")
+    if not os.path.exists(summary_path):
+        return None
+    try:
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    except Exception:
+        return None
+    if summary.get("parse_options") != parse_options:
+        return None
+    if not os.path.exists(summary.get("full_text") or ""):
+        return None
+    summary["cached"] = True  # in-memory marker only, never written back
+    return summary
+
+
+def _projects_path(path):
+    return os.path.join(os.path.dirname(path), "process", "projects.json")
+
+
+def _load_projects(path):
+    try:
+        with open(_projects_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def previous_process_dir(path, project, kind):
+    """Process directory of the last parse of ``project`` (the name the
+    author uploads under), or None if there is none on disk."""
+    previous = _load_projects(path).get(f"{kind}:{project}")
+    if previous and os.path.isdir(previous):
+        return previous
+    return None
+
+
+# Serializes the read-modify-write of projects.json
+_projects_lock = threading.Lock()
+
+
+def remember_process_dir(path, project, kind, process_dir):
+    """Record process_dir as the latest parse of ``project``."""
+    projects_path = _projects_path(path)
+    os.makedirs(os.path.dirname(projects_path), exist_ok=True)
+    with _projects_lock:
+        projects = _load_projects(path)
+        projects[f"{kind}:{project}"] = process_dir
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(projects_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(projects, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, projects_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+            raise
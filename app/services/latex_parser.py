@@ -1,25 +1,234 @@
 import json
 import os
+import posixpath
 import re
+import shutil
 import zipfile
 from typing import Dict, List, Tuple
 
+from app.config import MAX_ZIP_EXTRACT_SIZE, MAX_ZIP_MEMBERS
+from app.services.ingest import (
+    load_cached_parse,
+    previous_process_dir,
+    process_dir_for,
+    publish_dir,
+    remember_process_dir,
+    staging_dir_for,
+)
+from app.services.latex_tokens import Token, arg_text, commands, tokenize, write_tokens
+from app.services.source_map import SourceMap, srcmap_path_for
 
-def _safe_extract_zip(zip_path: str, dest_dir: str) -> List[str]:
+
+# Members the pipeline reads; graphics are extracted only when referenced
+SOURCE_EXTENSIONS = (".tex", ".bib", ".bbl", ".sty", ".cls")
+GRAPHICS_EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf", ".eps")
+_COPY_CHUNK = 1024 * 1024
+
+# Main-file detection reads at most this much of each .tex member
+_MAIN_SCAN_BYTES = 8 * 1024
+_MAIN_SCAN_CHUNK = 1024
+_MAIN_NAMES = ("main", "paper", "ms", "manuscript", "article", "root")
+
+# Per-file hashes and subtree spans, kept for incremental re-parses
+_SOURCES_FILE = "sources.json"
+
+_GRAPHICS_COMMANDS = ("includegraphics", "includegraphics*")
+# Commands whose argument names a member to extract, whatever its extension
+_REFERENCE_COMMANDS = ("input", "include", "subfile")
+
+
+def _member_target(dest_dir: str, name: str) -> str | None:
+    target_path = os.path.normpath(os.path.join(dest_dir, name))
+    if not os.path.abspath(target_path).startswith(os.path.abspath(dest_dir) + os.sep):
+        return None
+    return target_path
+
+
+def _copy_member(zf: zipfile.ZipFile, member: zipfile.ZipInfo, target_path: str, budget: int) -> int:
+    """Stream one member to disk in chunks; returns the bytes written.
+
+    Raises ValueError once ``budget`` bytes are exceeded, whatever the
+    central directory claims the member size is.
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    written = 0
+    with zf.open(member, "r") as src, open(target_path, "wb") as dst:
+        while True:
+            chunk = src.read(_COPY_CHUNK)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > budget:
+                raise ValueError("ZIP content too large")
+            dst.write(chunk)
+    return written
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _place_member(zf: zipfile.ZipFile, member: zipfile.ZipInfo, target_path: str, budget: int,
+                  previous: Dict[str, Dict]) -> Tuple[int, bool]:
+    """Write one member, reusing the previous parse's copy when CRC and size match.
+
+    Returns (bytes, reused).
+    """
+    prev = previous.get(member.filename)
+    if (prev and prev["crc"] == member.CRC and prev["size"] == member.file_size
+            and os.path.isfile(prev["path"])):
+        if member.file_size > budget:
+            raise ValueError("ZIP content too large")
+        _link_or_copy(prev["path"], target_path)
+        return member.file_size, True
+    return _copy_member(zf, member, target_path, budget), False
+
+
+def _reference_keys(ref: str, member_name: str, extensions: Tuple[str, ...]) -> List[str]:
+    """Normalized member names an \\input or \\includegraphics argument can
+    mean: relative to the referencing member, then to the ZIP root, with
+    ``../`` resolved. Without an extension, every one of ``extensions`` is
+    tried, and the bare name too."""
+    ref = ref.strip().strip('"').strip("'").replace("\\", "/")
+    if not ref:
+        return []
+    keys = []
+    for base in (posixpath.dirname(member_name), ""):
+        path = posixpath.normpath(posixpath.join(base, ref)).lower()
+        # A path climbing above the ZIP root still names the same member
+        while path.startswith("../"):
+            path = path[3:]
+        path = re.sub(r"^(\./)+", "", path)
+        if posixpath.splitext(path)[1]:
+            candidates = [path]
+        else:
+            candidates = [path + e for e in extensions] + [path]
+        keys.extend(c for c in candidates if c not in keys)
+    return keys
+
+
+def _is_referenced(name: str, keys: List[str]) -> bool:
+    name = name.lower()
+    return any(name == key or name.endswith("/" + key) for key in keys)
+
+
+def _referenced_keys(member_name: str, text: str, tokens: List[Token]) -> Tuple[List[str], List[str]]:
+    """(input keys, graphics keys) of one source member."""
+    inputs, graphics = [], []
+    for token in commands(tokens, _REFERENCE_COMMANDS):
+        inputs.extend(_reference_keys(arg_text(text, token), member_name, (".tex",)))
+    for token in commands(tokens, _GRAPHICS_COMMANDS):
+        graphics.extend(_reference_keys(arg_text(text, token), member_name, GRAPHICS_EXTENSIONS))
+    return inputs, graphics
+
+
+def _check_zip_bounds(members: List[zipfile.ZipInfo]) -> None:
+    """Refuse archives over the entry limit, or whose sources alone (always
+    extracted) declare more than the extraction budget. Runs on the central
+    directory only, before any member is opened."""
+    if len(members) > MAX_ZIP_MEMBERS:
+        raise ValueError(f"ZIP has too many entries ({len(members)} > {MAX_ZIP_MEMBERS})")
+    declared = sum(m.file_size for m in members if m.filename.lower().endswith(SOURCE_EXTENSIONS))
+    if declared > MAX_ZIP_EXTRACT_SIZE:
+        raise ValueError(f"ZIP sources exceed the extraction limit ({declared} > {MAX_ZIP_EXTRACT_SIZE} bytes)")
+
+
+def _safe_extract_zip(zip_path: str, dest_dir: str, previous: Dict[str, Dict] | None = None) -> Dict:
+    """Extract only what the pipeline consumes, streaming each member.
+
+    1) LaTeX sources (SOURCE_EXTENSIONS) are always extracted.
+    2) Any other member is extracted when a source names it: through
+       \\input/\\include/\\subfile (whatever its extension, e.g. .tikz,
+       .pgf, .txt; such files are scanned for references in turn) or
+       \\includegraphics. References are resolved against the referencing
+       member's directory, ``../`` included.
+    3) Everything else is listed in the manifest without being written.
+
+    ``previous`` maps member names of an earlier parse of the same project to
+    {"crc", "size", "path"}; unchanged members are hard-linked from there
+    instead of being decompressed again.
+
+    Returns {"extracted": [paths], "skipped": [{"name", "size"}],
+    "reused": [names], "members": {name: {"crc", "size"}},
+    "sources": {path: (text, tokens)} for the .tex files already read}.
+    """
+    previous = previous or {}
+    sources_read: Dict[str, Tuple[str, List[Token]]] = {}
     extracted = []
+    skipped = []
+    reused = []
+    members_info: Dict[str, Dict] = {}
+    budget = MAX_ZIP_EXTRACT_SIZE
     with zipfile.ZipFile(zip_path, "r") as zf:
-        for member in zf.infolist():
+        members = zf.infolist()
+        _check_zip_bounds(members)
+
+        sources, others = [], []
+        for member in members:
             name = member.filename
             if not name or name.endswith("/"):
                 continue
-            target_path = os.path.normpath(os.path.join(dest_dir, name))
-            if not os.path.abspath(target_path).startswith(os.path.abspath(dest_dir) + os.sep):
-                continue
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-            with zf.open(member, "r") as src, open(target_path, "wb") as dst:
-                dst.write(src.read())
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                sources.append(member)
+            else:
+                others.append(member)
+
+        input_keys: List[str] = []
+        graphics_keys: List[str] = []
+
+        def place(member: zipfile.ZipInfo, target_path: str) -> None:
+            nonlocal budget
+            written, was_reused = _place_member(zf, member, target_path, budget, previous)
+            budget -= written
             extracted.append(target_path)
-    return extracted
+            members_info[member.filename] = {"crc": member.CRC, "size": member.file_size}
+            if was_reused:
+                reused.append(member.filename)
+
+        for member in sources:
+            target_path = _member_target(dest_dir, member.filename)
+            if target_path is None:
+                continue
+            place(member, target_path)
+            if target_path.lower().endswith(".tex"):
+                text, tokens = sources_read[target_path] = _load_source(target_path)
+                inputs, graphics = _referenced_keys(member.filename, text, tokens)
+                input_keys.extend(inputs)
+                graphics_keys.extend(graphics)
+
+        # An \input-ed .tikz or .txt file can reference further files, so
+        # repeat until no new member is named
+        pending = others
+        while True:
+            remaining = []
+            for member in pending:
+                target_path = _member_target(dest_dir, member.filename)
+                as_input = _is_referenced(member.filename, input_keys)
+                if target_path is None or not (as_input or _is_referenced(member.filename, graphics_keys)):
+                    remaining.append(member)
+                    continue
+                place(member, target_path)
+                if as_input and not member.filename.lower().endswith(GRAPHICS_EXTENSIONS):
+                    text, tokens = _load_source(target_path)
+                    inputs, graphics = _referenced_keys(member.filename, text, tokens)
+                    input_keys.extend(inputs)
+                    graphics_keys.extend(graphics)
+            if len(remaining) == len(pending):
+                break
+            pending = remaining
+        skipped.extend({"name": m.filename, "size": m.file_size} for m in pending)
+
+    return {
+        "extracted": extracted,
+        "skipped": skipped,
+        "reused": reused,
+        "members": members_info,
+        "sources": sources_read,
+    }
 
 
 def _normalize_dir_names(root_dir: str) -> None:
@@ -45,13 +254,12 @@ def _read_text(path: str) -> str:
             return f.read()
 
 
-def _strip_comments(text: str) -> str:
-    cleaned = []
-    for line in text.splitlines():
-        # Remove unescaped % comments
-        line = re.sub(r"(?<!\\)%.*", "", line)
-        cleaned.append(line)
-    return "\n".join(cleaned)
+def _load_source(path: str) -> Tuple[str, List[Token]]:
+    """A .tex file and its token stream; a single trailing newline is dropped."""
+    text = _read_text(path)
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text, tokenize(text)
 
 
 def _normalize_ref_dirs(ref: str) -> str:
@@ -62,122 +270,418 @@ def _normalize_ref_dirs(ref: str) -> str:
     return "/".join(dir_parts + [parts[-1]])
 
 
-def _resolve_tex_path(base_dir: str, project_root: str, ref: str) -> str:
-    ref = ref.strip().strip('"').strip("'")
-    candidates = []
-    if os.path.isabs(ref):
-        candidates.append(ref)
-    else:
-        refs = [ref]
-        normalized_ref = _normalize_ref_dirs(ref)
-        if normalized_ref != ref:
-            refs.append(normalized_ref)
-        for r in refs:
-            candidates.append(os.path.join(base_dir, r))
-            if project_root and os.path.abspath(project_root) != os.path.abspath(base_dir):
-                candidates.append(os.path.join(project_root, r))
-
-    expanded = []
-    for cand in candidates:
-        cand = os.path.normpath(cand)
-        root, ext = os.path.splitext(cand)
-        if ext:
-            expanded.append(cand)
-        else:
-            expanded.append(cand + ".tex")
-            expanded.append(cand)
-
-    for path in expanded:
-        if os.path.exists(path):
-            return path
-
-    return os.path.normpath(candidates[0]) if candidates else ref
+class _FileIndex:
+    """One-time listing of the extracted tree, so resolving a reference is a dict lookup.
 
+    Paths are looked up exactly first, then case- and space-insensitively
+    (authors on macOS/Windows often write \\input{Sections/Intro} for
+    sections/intro.tex). Resolutions are memoized per (base_dir, ref) and file
+    contents are read and tokenized at most once.
+    """
 
-def _resolve_graphics_paths(base_dir: str, project_root: str, ref: str) -> List[str]:
-    ref = ref.strip().strip('"').strip("'")
-    candidates: List[str] = []
-    if os.path.isabs(ref):
-        candidates.append(ref)
-    else:
+    def __init__(self, project_root: str, sources: Dict[str, Tuple[str, List[Token]]] | None = None):
+        self.project_root = os.path.abspath(project_root)
+        self._exact = set()
+        self._loose: Dict[str, str] = {}
+        for root, _, files in os.walk(self.project_root):
+            for name in files:
+                path = os.path.join(root, name)
+                self._exact.add(path)
+                self._loose.setdefault(self._loose_key(path), path)
+        self._resolved: Dict[tuple, str | None] = {}
+        self._sources: Dict[str, Tuple[str, List[Token]]] = {}
+        for path, source in (sources or {}).items():
+            # Directory names may have been normalized since the file was read
+            found = self.lookup(path)
+            if found:
+                self._sources[found] = source
+        self.graphics_dirs: List[str] = []
+
+    def files(self) -> List[str]:
+        return sorted(os.path.relpath(p, self.project_root) for p in self._exact)
+
+    @staticmethod
+    def _loose_key(path: str) -> str:
+        return path.lower().replace(" ", "_")
+
+    def lookup(self, path: str) -> str | None:
+        path = os.path.abspath(path)
+        if path in self._exact:
+            return path
+        return self._loose.get(self._loose_key(path))
+
+    def read(self, path: str) -> Tuple[str, List[Token]]:
+        source = self._sources.get(path)
+        if source is None:
+            source = self._sources[path] = _load_source(path)
+        return source
+
+    def _bases(self, base_dir: str, ref: str) -> List[str]:
+        """Candidate stems for ``ref``: relative to the including file, then the project root."""
+        ref = ref.strip().strip('"').strip("'")
+        if os.path.isabs(ref):
+            return [os.path.normpath(ref)]
         refs = [ref]
         normalized_ref = _normalize_ref_dirs(ref)
         if normalized_ref != ref:
             refs.append(normalized_ref)
-        for r in refs:
-            candidates.append(os.path.join(base_dir, r))
-            if project_root and os.path.abspath(project_root) != os.path.abspath(base_dir):
-                candidates.append(os.path.join(project_root, r))
-    expanded: List[str] = []
-    for cand in candidates:
-        cand = os.path.normpath(cand)
-        root, ext = os.path.splitext(cand)
-        if ext:
-            expanded.append(cand)
-        else:
-            expanded.extend([
-                cand + ".png",
-                cand + ".jpg",
-                cand + ".jpeg",
-                cand + ".pdf",
-                cand + ".eps",
-                cand,
-            ])
-    return [os.path.abspath(p) for p in expanded if p]
-
-
-def _extract_graphics_paths(text: str, base_dir: str, project_root: str) -> List[Dict]:
+        dirs = [base_dir]
+        if os.path.abspath(base_dir) != self.project_root:
+            dirs.append(self.project_root)
+        return [os.path.normpath(os.path.join(d, r)) for r in refs for d in dirs]
+
+    def resolve_tex(self, base_dir: str, ref: str) -> str | None:
+        key = ("tex", base_dir, ref)
+        if key not in self._resolved:
+            found = None
+            for cand in self._bases(base_dir, ref):
+                tries = [cand] if os.path.splitext(cand)[1] else [cand + ".tex", cand]
+                found = next((p for p in map(self.lookup, tries) if p), None)
+                if found:
+                    break
+            self._resolved[key] = found
+        return self._resolved[key]
+
+    def resolve_graphics(self, base_dir: str, ref: str) -> str | None:
+        # \graphicspath entries grow while the document is expanded, so they are
+        # part of the memo key
+        key = ("graphics", base_dir, ref, tuple(self.graphics_dirs))
+        if key not in self._resolved:
+            bases = self._bases(base_dir, ref)
+            for gdir in self.graphics_dirs:
+                bases.extend(self._bases(base_dir, os.path.join(gdir, ref.strip())))
+            found = None
+            for cand in bases:
+                tries = [cand] if os.path.splitext(cand)[1] else [cand + e for e in GRAPHICS_EXTENSIONS] + [cand]
+                found = next((p for p in map(self.lookup, tries) if p), None)
+                if found:
+                    break
+            self._resolved[key] = found
+        return self._resolved[key]
+
+
+def _collect_graphicspath(text: str, tokens: List[Token], index: _FileIndex) -> None:
+    for token in commands(tokens, ("graphicspath",)):
+        for gdir in re.findall(r"\{([^}]*)\}", arg_text(text, token)):
+            gdir = gdir.strip()
+            if gdir and gdir not in index.graphics_dirs:
+                index.graphics_dirs.append(gdir)
+
+
+def _extract_graphics_paths(text: str, tokens: List[Token], base_dir: str, index: _FileIndex,
+                            rel: str) -> List[Dict]:
     images = []
-    pattern = re.compile(r"\\includegraphics(?:\s*\[[^\]]*\])?\s*\{([^}]+)\}")
-    for match in pattern.finditer(text):
-        raw_path = match.group(1).strip()
-        candidates = _resolve_graphics_paths(base_dir, project_root, raw_path)
-        resolved = next((p for p in candidates if os.path.exists(p)), None)
+    line, pos = 1, 0
+    for token in commands(tokens, _GRAPHICS_COMMANDS):
+        raw_path = arg_text(text, token)
+        if not raw_path:
+            continue
+        line += text.count("\n", pos, token.start)
+        pos = token.start
         images.append(
             {
                 "path": raw_path,
-                "resolved_path": resolved,
+                "resolved_path": index.resolve_graphics(base_dir, raw_path),
+                "location": f"{rel}:{line}",
             }
         )
     return images
 
 
-def _expand_inputs(path: str, project_root: str, visited: set) -> Tuple[str, List[Dict]]:
-    abs_path = os.path.abspath(path)
-    if abs_path in visited:
-        return "", []
-    visited.add(abs_path)
+_INPUT_COMMANDS = ("input", "include")
 
-    base_dir = os.path.dirname(path)
-    raw_text = _read_text(path)
-    text = _strip_comments(raw_text)
 
-    images = _extract_graphics_paths(text, base_dir, project_root)
+class _Expansion:
+    """Depth-first \\input/\\include expansion into one merged text.
 
-    # Avoid matching \includegraphics as \include
-    input_pattern = re.compile(r"\\(input|include)(?!graphics)\s*(\{([^}]+)\}|([^\s%]+))")
+    Besides the text and images, every expanded file records its subtree:
+    the [start, end) span it produced in the merged text, its slice of the
+    image list, the files it expanded, the files it skipped as already
+    visited, and the \\graphicspath state before and after. A later parse
+    of a revised upload copies a subtree span verbatim when none of its
+    files changed (see _PreviousParse.reuse).
 
-    def replace(match: re.Match) -> str:
-        ref = match.group(3) or match.group(4) or ""
-        target = _resolve_tex_path(base_dir, project_root, ref)
-        if not os.path.exists(target):
-            return f"\n% [Missing input: {ref}]\n"
-        nested_text, nested_images = _expand_inputs(target, project_root, visited)
-        images.extend(nested_images)
-        return "\n" + nested_text + "\n"
+    Every emitted segment also goes into ``srcmap`` with the file and line
+    it came from; file ids index ``source_files``.
+    """
 
-    expanded = input_pattern.sub(replace, text)
-    return expanded, images
+    def __init__(self, index: _FileIndex, previous: "_PreviousParse | None" = None):
+        self.index = index
+        self.previous = previous
+        self.visited = set()
+        self.parts: List[str] = []
+        self.pos = 0
+        self.images: List[Dict] = []
+        self.subtrees: Dict[str, Dict] = {}
+        self.reused = 0
+        self.srcmap = SourceMap()
+        self.source_files: List[str] = []
+        self._file_ids: Dict[str, int] = {}
+
+    def file_id(self, rel: str) -> int:
+        file_id = self._file_ids.get(rel)
+        if file_id is None:
+            file_id = self._file_ids[rel] = len(self.source_files)
+            self.source_files.append(rel)
+        return file_id
+
+    def _emit(self, text: str, file_id: int | None = None, line: int = 0, advance: bool = True) -> None:
+        """Append ``text``; with a file id, also map each of its lines to the source.
+
+        Inserted text (``advance=False``) maps entirely to ``line``.
+        """
+        if not text:
+            return
+        if file_id is not None:
+            srcmap, pos = self.srcmap, self.pos
+            srcmap.add(pos, file_id, line)
+            i = text.find("\n") if advance else -1
+            while i != -1:
+                line += 1
+                srcmap.add(pos + i + 1, file_id, line)
+                i = text.find("\n", i + 1)
+        self.parts.append(text)
+        self.pos += len(text)
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def expand(self, path: str) -> Tuple[set, set]:
+        """Expand ``path`` in place; returns (expanded files, skipped files) as relative paths."""
+        index = self.index
+        abs_path = os.path.abspath(path)
+        rel = os.path.relpath(abs_path, index.project_root)
+        if abs_path in self.visited:
+            return set(), {rel}
+        if self.previous is not None:
+            reused = self.previous.reuse(rel, self)
+            if reused is not None:
+                self.reused += 1
+                return reused
+        self.visited.add(abs_path)
+
+        start, img_start = self.pos, len(self.images)
+        gdirs_before = list(index.graphics_dirs)
+        files, skipped = {rel}, set()
+
+        base_dir = os.path.dirname(abs_path)
+        text, tokens = index.read(abs_path)
+        _collect_graphicspath(text, tokens, index)
+        self.images.extend(_extract_graphics_paths(text, tokens, base_dir, index, rel))
+
+        # Copy the text between tokens, dropping comments and splicing inputs.
+        # ``line`` is the source line at ``last``; comments never span lines.
+        file_id = self.file_id(rel)
+        last, line = 0, 1
+
+        def emit_until(end: int) -> int:
+            self._emit(text[last:end], file_id, line)
+            return line + text.count("\n", last, end)
+
+        for token in tokens:
+            if token.kind == "comment":
+                line = emit_until(token.start)
+                last = token.end
+                continue
+            if token.kind != "cmd" or token.name not in _INPUT_COMMANDS or not token.args:
+                continue
+            line = emit_until(token.start)
+            last = token.end
+            ref = arg_text(text, token)
+            target = index.resolve_tex(base_dir, ref)
+            if target is None:
+                self._emit(f"\n% [Missing input: {ref}]\n", file_id, line, advance=False)
+                continue
+            self._emit("\n", file_id, line, advance=False)
+            nested_files, nested_skipped = self.expand(target)
+            files |= nested_files
+            skipped |= nested_skipped
+            self._emit("\n", file_id, line, advance=False)
+        emit_until(len(text))
+
+        self.subtrees[rel] = {
+            "start": start,
+            "end": self.pos,
+            "img_start": img_start,
+            "img_end": len(self.images),
+            "files": sorted(files),
+            "skipped": sorted(skipped),
+            "gdirs_before": gdirs_before,
+            "gdirs_after": list(index.graphics_dirs),
+        }
+        return files, skipped
+
+
+class _PreviousParse:
+    """What a revised upload can reuse from the project's previous parse."""
+
+    def __init__(self, process_dir: str, state: Dict, text: str, images: List[Dict],
+                 srcmap: SourceMap, source_files: List[str]):
+        self.process_dir = process_dir
+        self.srcmap = srcmap
+        self.source_files = source_files
+        self.members: Dict[str, Dict] = state.get("members", {})
+        self.files: List[str] = state.get("files", [])
+        self.subtrees: Dict[str, Dict] = state.get("subtrees", {})
+        self.text = text
+        self.images = images
+        self.changed: set = set()
+
+    @classmethod
+    def load(cls, process_dir: str | None) -> "_PreviousParse | None":
+        if not process_dir:
+            return None
+        try:
+            with open(os.path.join(process_dir, _SOURCES_FILE), "r", encoding="utf-8") as f:
+                state = json.load(f)
+            with open(os.path.join(process_dir, "summary.json"), "r", encoding="utf-8") as f:
+                summary = json.load(f)
+            text = _read_text(summary["full_text"])
+            srcmap = SourceMap.read(srcmap_path_for(summary["full_text"]))
+        except Exception:
+            return None
+        return cls(process_dir, state, text, summary.get("images", []), srcmap, summary.get("source_files", []))
+
+    def previous_members(self) -> Dict[str, Dict]:
+        """Member name -> {"crc", "size", "path"} of the previous extraction."""
+        return {
+            name: {**info, "path": os.path.join(self.process_dir, _normalize_ref_dirs(name))}
+            for name, info in self.members.items()
+        }
+
+    def compare(self, members: Dict[str, Dict], files: List[str]) -> None:
+        """Mark the files whose member changed since the previous parse.
+
+        Reference resolution depends on which files exist, so subtrees are
+        only reused when the extracted file list is the same.
+        """
+        if files != self.files:
+            self.subtrees = {}
+            return
+        self.changed = {
+            _normalize_ref_dirs(name)
+            for name, info in members.items()
+            if self.members.get(name) != info
+        }
+
+    def reuse(self, rel: str, expansion: _Expansion) -> Tuple[set, set] | None:
+        """Copy the previous output of ``rel``'s subtree when it cannot differ.
+
+        That holds when none of its files changed, \\graphicspath is in the
+        same state, and neither its expanded nor its skipped files have been
+        visited yet (so the visited-set short-circuits fire the same way).
+        """
+        sub = self.subtrees.get(rel)
+        if sub is None:
+            return None
+        files, skipped = set(sub["files"]), set(sub["skipped"])
+        if files & self.changed or not skipped <= files:
+            return None
+        if sub["gdirs_before"] != expansion.index.graphics_dirs:
+            return None
+        root = expansion.index.project_root
+        abs_files = {os.path.join(root, f) for f in files}
+        if abs_files & expansion.visited:
+            return None
+
+        expansion.visited |= abs_files
+        expansion.index.graphics_dirs[:] = sub["gdirs_after"]
+        offset, img_offset = expansion.pos - sub["start"], len(expansion.images) - sub["img_start"]
+        for image in self.images[sub["img_start"]:sub["img_end"]]:
+            resolved = image.get("resolved_path")
+            if resolved:
+                resolved = os.path.join(root, os.path.relpath(resolved, self.process_dir))
+            expansion.images.append({**image, "resolved_path": resolved})
+        expansion.srcmap.copy_range(
+            self.srcmap, sub["start"], sub["end"], offset,
+            lambda file_id: expansion.file_id(self.source_files[file_id]),
+        )
+        expansion._emit(self.text[sub["start"]:sub["end"]])
+        # Nested subtrees move with their parent
+        for nested in files:
+            prev = self.subtrees.get(nested)
+            if prev and sub["start"] <= prev["start"] and prev["end"] <= sub["end"]:
+                expansion.subtrees[nested] = {
+                    **prev,
+                    "start": prev["start"] + offset,
+                    "end": prev["end"] + offset,
+                    "img_start": prev["img_start"] + img_offset,
+                    "img_end": prev["img_end"] + img_offset,
+                }
+        return files, skipped
+
+
+def _has_begin_document(tokens: List[Token]) -> bool:
+    return any(t.kind == "begin" and t.name == "document" for t in tokens)
+
+
+def _scan_tex_head(zf: zipfile.ZipFile, member: zipfile.ZipInfo) -> Dict[str, bool]:
+    """Stream the start of a member until \\documentclass shows up (or the budget ends)."""
+    found = {"documentclass": False, "begin_document": False}
+    head = b""
+    with zf.open(member, "r") as src:
+        while len(head) < _MAIN_SCAN_BYTES:
+            chunk = src.read(_MAIN_SCAN_CHUNK)
+            if not chunk:
+                break
+            head += chunk
+            tokens = tokenize(head.decode("latin-1"))
+            found["begin_document"] = _has_begin_document(tokens)
+            found["documentclass"] = bool(commands(tokens, ("documentclass",)))
+            if found["documentclass"]:
+                break
+    return found
+
+
+def _find_main_member(zip_path: str) -> Dict:
+    """Pick the main .tex straight from the archive, before anything is extracted.
+
+    Candidates are members whose first few KB contain \\documentclass or
+    \\begin{document}. They are ranked by:
+      1) \\documentclass present
+      2) a conventional name (main.tex, paper.tex, ...)
+      3) fewer directory levels
+      4) shorter path
+
+    Returns {"main": member name or None, "candidates": [...], "warning": str or None}.
+    """
+    candidates = []
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        members = zf.infolist()
+        _check_zip_bounds(members)
+        for member in members:
+            name = member.filename
+            if not name.lower().endswith(".tex") or name.endswith("/"):
+                continue
+            found = _scan_tex_head(zf, member)
+            if found["documentclass"] or found["begin_document"]:
+                candidates.append({"name": name, **found})
+
+    def rank(c):
+        stem = os.path.splitext(os.path.basename(c["name"]))[0].lower()
+        return (not c["documentclass"], stem not in _MAIN_NAMES, c["name"].count("/"), len(c["name"]), c["name"])
+
+    candidates.sort(key=rank)
+    warning = None
+    with_class = [c["name"] for c in candidates if c["documentclass"]]
+    if len(with_class) > 1:
+        warning = f"Multiple files declare \\documentclass ({', '.join(with_class)}); using {candidates[0]['name']}"
+    return {
+        "main": candidates[0]["name"] if candidates else None,
+        "candidates": [c["name"] for c in candidates],
+        "warning": warning,
+    }
 
 
 def _find_main_tex(tex_files: List[str]) -> str:
+    """Fallback: full-text search, for mains whose preamble starts past the scanned head."""
     candidates = []
     for path in tex_files:
         try:
-            content = _read_text(path)
+            _, tokens = _load_source(path)
         except Exception:
             continue
-        if re.search(r"\\begin\s*\{document\}", content):
+        if _has_begin_document(tokens):
             candidates.append(path)
     if not candidates:
         raise ValueError("No main .tex file with \\begin{document} found")
@@ -185,47 +689,111 @@ def _find_main_tex(tex_files: List[str]) -> str:
     return candidates[0]
 
 
-def parse_latex_zip(path: str, filename: str) -> Tuple[str, Dict]:
+def parse_latex_zip(path: str, filename: str, project: str | None = None) -> Tuple[str, Dict]:
     """Extract LaTeX zip and build a merged text file.
 
     Steps:
-      1) Extract zip into uploads/process/<basename>
-      2) Find main .tex with \\begin{document}
-      3) Expand \\input/\\include into a single text file
+      0) Reuse a previous parse of the same (content-addressed) upload
+      1) Find main .tex from the zip itself (first KB of each .tex)
+      2) Extract zip into uploads/process/<basename>, hard-linking members
+         unchanged since the last parse of ``project``
+      3) Expand \\input/\\include into a single text file, copying the
+         subtrees whose files are all unchanged
       4) Collect \\includegraphics paths
-      5) Save summary.json
+      5) Save summary.json, sources.json (per-file hashes, subtree spans),
+         the merged text's token stream (full_text.tokens.json) and its
+         offset -> file:line map (full_text.srcmap)
+
+    Like the PDF parser, a new parse is built in a staging directory and
+    replaces process_dir only once it is complete, so a concurrent upload of
+    the same archive never sees (or caches) half of it.
+
+    ``project`` identifies revisions of the same submission (the original
+    upload name); without it every upload is parsed from scratch.
     """
-    base_dir = os.path.dirname(path)
-    basename = os.path.splitext(filename)[0].replace(" ", "_")
-    process_dir = os.path.join(base_dir, "process", f"{basename}__latex")
-    os.makedirs(process_dir, exist_ok=True)
-
-    _safe_extract_zip(path, process_dir)
-    _normalize_dir_names(process_dir)
-
-    tex_files = []
-    for root, _, files in os.walk(process_dir):
-        for name in files:
-            if name.lower().endswith(".tex"):
-                tex_files.append(os.path.join(root, name))
-
-    main_tex = _find_main_tex(tex_files)
-
-    merged_text, images = _expand_inputs(main_tex, process_dir, visited=set())
-
-    full_text_path = os.path.join(process_dir, f"full_text.txt")
-    with open(full_text_path, "w", encoding="utf-8") as f:
-        f.write(merged_text)
-
-    summary = {
-        "text_files": tex_files,
-        "full_text": full_text_path,
-        "tables": [],
-        "images": images,
-        "main_tex": main_tex,
-    }
+    process_dir = process_dir_for(path, filename, "latex")
+    parse_options = {}
+    cached = load_cached_parse(process_dir, parse_options)
+    if cached is not None:
+        if project:
+            remember_process_dir(path, project, "latex", process_dir)
+        return process_dir, cached
+    staging_dir = staging_dir_for(process_dir)
+
+    def published(path):
+        # Paths recorded in summary.json name the directory after publish_dir
+        return os.path.join(process_dir, os.path.relpath(path, staging_dir)) if path else path
 
-    with open(os.path.join(process_dir, "summary.json"), "w", encoding="utf-8") as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
+    try:
+        previous = None
+        if project:
+            previous = _PreviousParse.load(previous_process_dir(path, project, "latex"))
+
+        main_info = _find_main_member(path)
+        zip_manifest = _safe_extract_zip(path, staging_dir, previous.previous_members() if previous else None)
+        members = zip_manifest.pop("members")
+        sources = zip_manifest.pop("sources")
+        _normalize_dir_names(staging_dir)
+
+        tex_files = []
+        for root, _, files in os.walk(staging_dir):
+            for name in files:
+                if name.lower().endswith(".tex"):
+                    tex_files.append(os.path.join(root, name))
+
+        main_tex = None
+        if main_info["main"]:
+            # Extraction replaced spaces in directory names with underscores
+            main_tex = os.path.normpath(os.path.join(staging_dir, _normalize_ref_dirs(main_info["main"])))
+        if not main_tex or not os.path.isfile(main_tex):
+            main_tex = _find_main_tex(tex_files)
+
+        index = _FileIndex(staging_dir, sources)
+        if previous is not None:
+            previous.compare(members, index.files())
+        expansion = _Expansion(index, previous)
+        expansion.expand(main_tex)
+        merged_text, images = expansion.text(), expansion.images
+
+        full_text_path = os.path.join(staging_dir, f"full_text.txt")
+        with open(full_text_path, "w", encoding="utf-8") as f:
+            f.write(merged_text)
+        write_tokens(full_text_path, tokenize(merged_text))
+        expansion.srcmap.write(srcmap_path_for(full_text_path))
+
+        for image in images:
+            image["resolved_path"] = published(image.get("resolved_path"))
+        zip_manifest["extracted"] = [published(p) for p in zip_manifest["extracted"]]
+        summary = {
+            "text_files": [published(p) for p in tex_files],
+            "full_text": published(full_text_path),
+            "tables": [],
+            "images": images,
+            "main_tex": published(main_tex),
+            "source_files": expansion.source_files,
+            "main_tex_candidates": main_info["candidates"],
+            "main_tex_warning": main_info["warning"],
+            "zip_manifest": zip_manifest,
+            "incremental": {
+                "previous": previous.process_dir if previous else None,
+                "reused_members": len(zip_manifest["reused"]),
+                "reused_subtrees": expansion.reused,
+            },
+            "parse_options": parse_options,
+        }
+
+        with open(os.path.join(staging_dir, _SOURCES_FILE), "w", encoding="utf-8") as f:
+            json.dump({"members": members, "files": index.files(), "subtrees": expansion.subtrees}, f)
+
+        with open(os.path.join(staging_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        publish_dir(staging_dir, process_dir)
+    finally:
+        # Failed parses leave nothing behind
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    if project:
+        remember_process_dir(path, project, "latex", process_dir)
 
     return process_dir, summary
@@ -0,0 +1,221 @@
+"""Single-pass LaTeX tokenizer shared by the parser and the checks.
+
+One combined regex walks the text once and yields, in source order:
+
+- ``cmd``: a control word (``\\label``, ``\\input``, ...). Commands listed
+  in ARG_SPECS also get their arguments parsed;
+- ``begin`` / ``end``: environment delimiters, ``name`` is the environment;
+- ``url``: a bare http(s) URL, wherever it appears (text, ``\\url{}``, ...);
+- ``comment``: an unescaped ``%`` up to the end of the line.
+
+Arguments are stored as ``[delimiter, start, end]`` content spans ("{", "["
+or "" for a bare ``\\input file``), so consumers slice the text they already
+hold. The stream of a parsed document is cached as ``full_text.tokens.json``
+next to ``full_text.txt``.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+class Token(NamedTuple):
+    kind: str
+    name: str
+    start: int
+    end: int
+    args: list
+
+
+# Argument shapes per command: "b" = {required}, "o" = [optional],
+# "w" = {required} or a bare word (\input file)
+ARG_SPECS: Dict[str, str] = {
+    "begin": "b",
+    "end": "b",
+    "input": "w",
+    "include": "w",
+    "includegraphics": "ob",
+    "includegraphics*": "ob",
+    "graphicspath": "b",
+    "label": "b",
+    "ref": "b",
+    "eqref": "b",
+    "url": "b",
+    "href": "bb",
+    "documentclass": "ob",
+}
+
+_SCANNER = re.compile(
+    r"(?P<comment>%[^\n]*)"
+    r"|\\(?P<word>[A-Za-z@]+\*?)"
+    r"|\\."
+    r"|(?P<url>https?://[^\s\)<>\[\]{}\"'\\%]+)",
+    re.DOTALL,
+)
+_BRACES = re.compile(r"\\.|[{}]", re.DOTALL)
+_SPACE = re.compile(r"\s*")
+_BARE_WORD = re.compile(r"[^\s%]+")
+
+
+def _brace_group(text: str, pos: int) -> Optional[Tuple[int, int, int]]:
+    """Balanced {...} starting at text[pos] == "{"; returns (start, end, next_pos)."""
+    depth = 0
+    for match in _BRACES.finditer(text, pos):
+        char = match.group()
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return pos + 1, match.start(), match.end()
+    return None
+
+
+def _parse_args(text: str, pos: int, spec: str) -> Tuple[list, int]:
+    args = []
+    for shape in spec:
+        at = _SPACE.match(text, pos).end()
+        if shape == "o":
+            if text.startswith("[", at):
+                close = text.find("]", at)
+                if close != -1:
+                    args.append(["[", at + 1, close])
+                    pos = close + 1
+            continue
+        if text.startswith("{", at):
+            group = _brace_group(text, at)
+            if group is None:
+                break
+            args.append(["{", group[0], group[1]])
+            pos = group[2]
+        elif shape == "w":
+            word = _BARE_WORD.match(text, at)
+            if word is None:
+                break
+            args.append(["", word.start(), word.end()])
+            pos = word.end()
+        else:
+            break
+    return args, pos
+
+
+def tokenize(text: str) -> List[Token]:
+    """Tokenize ``text`` in one left-to-right pass.
+
+    Scanning resumes right after a command's name, so commands nested in its
+    arguments (a \\label inside a \\caption) are tokens too.
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    for match in _SCANNER.finditer(text):
+        group = match.lastgroup
+        if group == "word":
+            name = match.group("word")
+            spec = ARG_SPECS.get(name)
+            if spec is None:
+                append(Token("cmd", name, match.start(), match.end(), []))
+                continue
+            args, end = _parse_args(text, match.end(), spec)
+            if name in ("begin", "end") and args:
+                env = text[args[0][1]:args[0][2]].strip()
+                append(Token(name, env, match.start(), end, args))
+            else:
+                append(Token("cmd", name, match.start(), end, args))
+        elif group == "url":
+            append(Token("url", match.group("url"), match.start(), match.end(), []))
+        elif group == "comment":
+            append(Token("comment", "", match.start(), match.end(), []))
+    return tokens
+
+
+def arg_text(text: str, token: Token, i: int = -1) -> str:
+    """Text of argument ``i`` (default: the last one), stripped."""
+    if not token.args:
+        return ""
+    _, start, end = token.args[i]
+    return text[start:end].strip()
+
+
+def commands(tokens: Iterable[Token], names: Iterable[str]) -> List[Token]:
+    names = set(names)
+    return [t for t in tokens if t.kind == "cmd" and t.name in names]
+
+
+def env_spans(tokens: Iterable[Token], env: str) -> List[Tuple[int, int]]:
+    """(content start, content end) of every ``env`` environment, nesting-aware."""
+    spans = []
+    stack = []
+    for token in tokens:
+        if token.name != env:
+            continue
+        if token.kind == "begin":
+            stack.append(token.end)
+        elif token.kind == "end" and stack:
+            spans.append((stack.pop(), token.start))
+    spans.sort()
+    return spans
+
+
+def labels_in_spans(text: str, tokens: List[Token], spans: List[Tuple[int, int]]) -> Set[str]:
+    labels = set()
+    for token in commands(tokens, ("label",)):
+        if any(start <= token.start < end for start, end in spans):
+            labels.add(arg_text(text, token))
+    return labels
+
+
+# =========================================================
+# Cache next to full_text.txt
+# =========================================================
+
+def tokens_path_for(full_text_path: str) -> str:
+    return os.path.splitext(full_text_path)[0] + ".tokens.json"
+
+
+def write_tokens(full_text_path: str, tokens: List[Token]) -> None:
+    stat = os.stat(full_text_path)
+    with open(tokens_path_for(full_text_path), "w", encoding="utf-8") as f:
+        json.dump({
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "tokens": tokens,
+        }, f, separators=(",", ":"))
+
+
+def load_tokens(full_text_path: str) -> Tuple[str, List[Token]]:
+    """Text and token stream of a merged full text, tokenizing it on a cache miss."""
+    with open(full_text_path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    stat = os.stat(full_text_path)
+    try:
+        with open(tokens_path_for(full_text_path), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return text, [Token(*row) for row in cached["tokens"]]
+    except Exception:
+        pass
+    tokens = tokenize(text)
+    try:
+        write_tokens(full_text_path, tokens)
+    except OSError:
+        pass
+    return text, tokens
+
+
+def load_document_tokens(proj_path: str) -> Optional[Tuple[str, List[Token]]]:
+    """(text, tokens) of a LaTeX process directory, or None for PDFs and
+    directories without a parse."""
+    if not proj_path:
+        return None
+    try:
+        with open(os.path.join(proj_path, "summary.json"), "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    except Exception:
+        return None
+    if "main_tex" not in summary:
+        return None
+    full_text_path = summary.get("full_text")
+    if not full_text_path or not os.path.exists(full_text_path):
+        return None
+    return load_tokens(full_text_path)
@@ -0,0 +1,133 @@
+"""Compact per-document page store.
+
+A parsed PDF is kept as two files instead of one file per page:
+
+- ``full_text.txt``: every page's UTF-8 text, joined with a blank line
+  (exactly the merged full text, so it stays readable as-is);
+- ``full_text.idx``: little-endian uint64 (start, end) byte offsets of each
+  page inside the blob.
+
+Readers memory-map the blob, so a page, a page range or the full text is a
+slice of the same mapping.
+"""
+
+import mmap
+import os
+import sys
+from array import array
+from typing import Optional, Tuple
+
+PAGE_SEPARATOR = "\n\n"
+
+
+def index_path_for(blob_path: str) -> str:
+    return os.path.splitext(blob_path)[0] + ".idx"
+
+
+class PageStoreWriter:
+    """Append pages to a blob and write the offset index on close."""
+
+    def __init__(self, blob_path: str):
+        self.blob_path = blob_path
+        self._blob = open(blob_path, "wb")
+        self._offsets = array("Q")
+        self._pos = 0
+        self._separator = PAGE_SEPARATOR.encode("utf-8")
+
+    def add(self, text: str) -> Tuple[int, int]:
+        """Append one page; returns its (start, end) byte offsets."""
+        if self._offsets:
+            self._blob.write(self._separator)
+            self._pos += len(self._separator)
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        start, end = self._pos, self._pos + len(data)
+        self._offsets.extend((start, end))
+        self._pos = end
+        return start, end
+
+    def close(self) -> None:
+        self._blob.close()
+        offsets = self._offsets
+        if sys.byteorder != "little":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        with open(index_path_for(self.blob_path), "wb") as f:
+            offsets.tofile(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PageStore:
+    """Read-only, memory-mapped view of a page store.
+
+    A blob without an index (e.g. LaTeX full text) is treated as one page.
+    """
+
+    def __init__(self, blob_path: str):
+        self.blob_path = blob_path
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map: Optional[mmap.mmap] = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        )
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+        offsets = array("Q")
+        idx_path = index_path_for(blob_path)
+        if os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                offsets.frombytes(f.read())
+            if sys.byteorder != "little":
+                offsets.byteswap()
+        else:
+            offsets.extend((0, size))
+        self._starts = offsets[0::2]
+        self._ends = offsets[1::2]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def _check(self, number: int) -> int:
+        if not 1 <= number <= len(self):
+            raise IndexError(f"page {number} out of range 1..{len(self)}")
+        return number - 1
+
+    def page_bytes(self, number: int) -> memoryview:
+        """Zero-copy view of page ``number`` (1-based)."""
+        i = self._check(number)
+        return self._view[self._starts[i]:self._ends[i]]
+
+    def range_bytes(self, first: int, last: int) -> memoryview:
+        """Zero-copy view of pages ``first``..``last`` inclusive, separators included."""
+        return self._view[self._starts[self._check(first)]:self._ends[self._check(last)]]
+
+    def page(self, number: int) -> str:
+        return str(self.page_bytes(number), "utf-8")
+
+    def pages(self, first: int, last: int) -> str:
+        return str(self.range_bytes(first, last), "utf-8")
+
+    def full_text(self) -> str:
+        return str(self._view, "utf-8")
+
+    def close(self) -> None:
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_full_text(blob_path: str) -> str:
+    with PageStore(blob_path) as store:
+        return store.full_text()
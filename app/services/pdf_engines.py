@@ -0,0 +1,280 @@
+import os
+import difflib
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import fitz  # PyMuPDF
+
+# Same tolerances parse_pdf has always passed to pdfplumber
+X_TOLERANCE = 2
+Y_TOLERANCE = 3
+
+# Keep text that is clipped by (or placed outside) the MediaBox: hidden prompt
+# injections are often positioned off-page on purpose.
+_WORD_FLAGS = fitz.TEXTFLAGS_WORDS & ~fitz.TEXT_MEDIABOX_CLIP
+
+
+# =========================================================
+# 1. PyMuPDF engine (default, single document handle)
+# =========================================================
+
+class PyMuPDFPage:
+    """pdfplumber-like page adapter on top of a PyMuPDF page."""
+
+    def __init__(self, page, doctop_offset: float):
+        self._page = page
+        self._doctop_offset = doctop_offset
+        self._words = None
+        self.width = page.rect.width
+        self.height = page.rect.height
+
+    def _stream_words(self) -> List[Dict]:
+        if self._words is None:
+            raw = self._page.get_text("words", clip=fitz.INFINITE_RECT(), flags=_WORD_FLAGS)
+            words = []
+            prev_line = None
+            for x0, y0, x1, y1, text, block_no, line_no, _ in raw:
+                if not text:
+                    continue
+                # pdfplumber only splits words on gaps wider than x_tolerance
+                if prev_line == (block_no, line_no) and x0 - words[-1]["x1"] <= X_TOLERANCE:
+                    last = words[-1]
+                    last["text"] += text
+                    last["x1"] = x1
+                    last["bottom"] = max(last["bottom"], y1)
+                    continue
+                words.append({
+                    "text": text,
+                    "x0": x0,
+                    "x1": x1,
+                    "top": y0,
+                    "bottom": y1,
+                    "doctop": self._doctop_offset + y0,
+                })
+                prev_line = (block_no, line_no)
+            self._words = words
+        return self._words
+
+    def extract_text(self, x_tolerance=X_TOLERANCE, y_tolerance=Y_TOLERANCE) -> str:
+        """Content-stream ordered text (the use_text_flow=True equivalent)."""
+        lines = []
+        parts: List[str] = []
+        line_top = None
+        prev_x1 = None
+        for w in self._stream_words():
+            if line_top is None or abs(w["top"] - line_top) > y_tolerance or w["x0"] < prev_x1 - x_tolerance:
+                if parts:
+                    lines.append("".join(parts))
+                parts = [w["text"]]
+                line_top = w["top"]
+            else:
+                if (w["x0"] - prev_x1) > x_tolerance:
+                    parts.append(" ")
+                parts.append(w["text"])
+            prev_x1 = w["x1"]
+        if parts:
+            lines.append("".join(parts))
+        return "\n".join(lines)
+
+    def extract_words(self, x_tolerance=X_TOLERANCE, y_tolerance=Y_TOLERANCE, **_) -> List[Dict]:
+        return list(self._stream_words())
+
+
+class PyMuPDFEngine:
+    """Text, words and images from one ``fitz.Document`` handle."""
+
+    name = "pymupdf"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.doc = fitz.open(path)
+
+    def __len__(self) -> int:
+        return len(self.doc)
+
+    def pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[PyMuPDFPage]:
+        stop = len(self.doc) if stop is None else min(stop, len(self.doc))
+        doctop = sum(self.doc[i].rect.height for i in range(start))
+        for index in range(start, stop):
+            page = self.doc[index]
+            yield PyMuPDFPage(page, doctop)
+            doctop += page.rect.height
+
+    def iter_images(self) -> Iterator[Dict]:
+        return _iter_image_manifest(self.doc)
+
+    def close(self) -> None:
+        self.doc.close()
+
+
+# =========================================================
+# 2. pdfplumber engine (opt-in fallback)
+# =========================================================
+
+class PdfplumberPage:
+    def __init__(self, page):
+        self._page = page
+        self.width = page.width
+        self.height = page.height
+
+    def extract_text(self, x_tolerance=X_TOLERANCE, y_tolerance=Y_TOLERANCE) -> str:
+        return self._page.extract_text(
+            x_tolerance=x_tolerance,
+            y_tolerance=y_tolerance,
+            use_text_flow=True
+        ) or ""
+
+    def extract_words(self, x_tolerance=X_TOLERANCE, y_tolerance=Y_TOLERANCE, **_) -> List[Dict]:
+        return self._page.extract_words(
+            x_tolerance=x_tolerance,
+            y_tolerance=y_tolerance,
+            keep_blank_chars=False
+        )
+
+
+class PdfplumberEngine:
+    """Legacy behaviour: pdfplumber for text, a second PyMuPDF open for images."""
+
+    name = "pdfplumber"
+
+    def __init__(self, path: str):
+        import pdfplumber
+
+        self.path = path
+        self.pdf = pdfplumber.open(path)
+
+    def __len__(self) -> int:
+        return len(self.pdf.pages)
+
+    def pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[PdfplumberPage]:
+        for page in self.pdf.pages[start:stop]:
+            yield PdfplumberPage(page)
+
+    def iter_images(self) -> Iterator[Dict]:
+        doc = fitz.open(self.path)
+        try:
+            yield from _iter_image_manifest(doc)
+        finally:
+            doc.close()
+
+    def close(self) -> None:
+        self.pdf.close()
+
+
+ENGINES = {
+    PyMuPDFEngine.name: PyMuPDFEngine,
+    PdfplumberEngine.name: PdfplumberEngine,
+}
+
+
+@contextmanager
+def open_pdf(path: str, engine: str = PyMuPDFEngine.name):
+    """Open ``path`` with the named extraction engine."""
+    if engine not in ENGINES:
+        raise ValueError(f"unknown PDF engine: {engine} (expected one of {sorted(ENGINES)})")
+    doc = ENGINES[engine](path)
+    try:
+        yield doc
+    finally:
+        doc.close()
+
+
+# =========================================================
+# 3. Images
+# =========================================================
+
+def _iter_image_manifest(doc) -> Iterator[Dict]:
+    """One metadata record per image xref, read from the xref table only.
+
+    Nothing is decoded here: a logo repeated on 30 pages is one record whose
+    "pages" lists all 30.
+    """
+    manifest: Dict[int, Dict] = {}
+    for p_idx in range(len(doc)):
+        for img in doc[p_idx].get_images(full=True):
+            xref, smask, width, height, bpc, colorspace, _, name, img_filter = img[:9]
+            entry = manifest.get(xref)
+            if entry is None:
+                entry = manifest[xref] = {
+                    "xref": xref,
+                    "width": width,
+                    "height": height,
+                    "bpc": bpc,
+                    "colorspace": colorspace,
+                    "filter": img_filter,
+                    "smask": smask,
+                    "name": name,
+                    "pages": [],
+                    "path": None,
+                }
+            if not entry["pages"] or entry["pages"][-1] != p_idx + 1:
+                entry["pages"].append(p_idx + 1)
+    yield from manifest.values()
+
+
+def extract_image_file(pdf_path: str, xref: int, out_dir: str) -> Optional[str]:
+    """Decode one image xref and store it content-addressed in ``out_dir``.
+
+    Returns the file path (<sha256>.<ext>), or None if the xref is not a
+    decodable image.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        base = doc.extract_image(xref)
+    except Exception:
+        return None
+    finally:
+        doc.close()
+    if not base or not base.get("image"):
+        return None
+    img_bytes = base["image"]
+    ext = base.get("ext", "png")
+    os.makedirs(out_dir, exist_ok=True)
+    img_path = os.path.join(out_dir, f"{hashlib.sha256(img_bytes).hexdigest()}.{ext}")
+    if not os.path.exists(img_path):
+        with open(img_path, "wb") as f:
+            f.write(img_bytes)
+    return img_path
+
+
+# =========================================================
+# 4. Engine parity
+# =========================================================
+
+def compare_engines(path: str, threshold: float = 0.98) -> Dict:
+    """Compare the PyMuPDF and pdfplumber engines page by page.
+
+    Texts are compared as whitespace-normalized token sequences, since the two
+    libraries disagree on glyph boxes by fractions of a point.
+    """
+    from app.services.pdf_parser import rebuild_text_from_words
+
+    def _ratio(a: List[str], b: List[str]) -> float:
+        return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+    pages = []
+    with open_pdf(path, "pymupdf") as mu, open_pdf(path, "pdfplumber") as pl:
+        if len(mu) != len(pl):
+            return {"ok": False, "pages": [], "error": f"page count {len(mu)} != {len(pl)}"}
+        for i, (a, b) in enumerate(zip(mu.pages(), pl.pages()), start=1):
+            text_ratio = _ratio(a.extract_text().split(), b.extract_text().split())
+            word_ratio = _ratio(
+                rebuild_text_from_words(a.extract_words()).split(),
+                rebuild_text_from_words(b.extract_words()).split(),
+            )
+            pages.append({"page": i, "text_ratio": text_ratio, "word_ratio": word_ratio})
+    ok = all(p["text_ratio"] >= threshold and p["word_ratio"] >= threshold for p in pages)
+    return {"ok": ok, "pages": pages}
+
+
+if __name__ == "__main__":
+    import sys
+
+    ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "uploads", "check_test.pdf")
+    report = compare_engines(target)
+    for row in report["pages"]:
+        print(f"page {row['page']}: text {row['text_ratio']:.4f}, words {row['word_ratio']:.4f}")
+    print("parity OK" if report["ok"] else "parity FAILED")
+    sys.exit(0 if report["ok"] else 1)
@@ -1,226 +1,447 @@
-import os
-import json
-import csv
-import re
-
-import fitz  # PyMuPDF
-import pdfplumber
-
-def _normalize_dir_names(root_dir: str) -> None:
-    for current_root, dirnames, _ in os.walk(root_dir, topdown=False):
-        for dirname in dirnames:
-            if " " not in dirname:
-                continue
-            src = os.path.join(current_root, dirname)
-            dst = os.path.join(current_root, dirname.replace(" ", "_"))
-            if os.path.abspath(src) == os.path.abspath(dst):
-                continue
-            if os.path.exists(dst):
-                continue
-            os.rename(src, dst)
-
+import os
+import json
+import shutil
+import csv
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+from app.config import PDF_ENGINE, PDF_PARSE_WORKERS, PDF_PARALLEL_MIN_PAGES
+from app.services.ingest import load_cached_parse, process_dir_for, publish_dir, staging_dir_for
+from app.services.page_store import PageStoreWriter, index_path_for
+from app.services.pdf_engines import extract_image_file, open_pdf
+from app.services.workers import get_process_pool
+
+def _normalize_dir_names(root_dir: str) -> None:
+    for current_root, dirnames, _ in os.walk(root_dir, topdown=False):
+        for dirname in dirnames:
+            if " " not in dirname:
+                continue
+            src = os.path.join(current_root, dirname)
+            dst = os.path.join(current_root, dirname.replace(" ", "_"))
+            if os.path.abspath(src) == os.path.abspath(dst):
+                continue
+            if os.path.exists(dst):
+                continue
+            os.rename(src, dst)
+
 # =========================================================
 # 1. Missing-space detection (whether to fallback to words)
 # =========================================================
-
-def has_long_english_token(text, threshold=20):
-    return any(
-        len(m.group()) >= threshold
-        for m in re.finditer(r"[A-Za-z]+", text)
-    )
-
-
-def space_ratio(text):
-    if not text:
-        return 1.0
-    return text.count(" ") / len(text)
-
-
-def is_space_missing(text):
-    signals = 0
-    if has_long_english_token(text):
-        signals += 1
-    if space_ratio(text) < 0.08:
-        signals += 1
-    return signals >= 1
-
-
+
+def has_long_english_token(text, threshold=20):
+    return any(
+        len(m.group()) >= threshold
+        for m in re.finditer(r"[A-Za-z]+", text)
+    )
+
+
+def space_ratio(text):
+    if not text:
+        return 1.0
+    return text.count(" ") / len(text)
+
+
+def is_space_missing(text):
+    signals = 0
+    if has_long_english_token(text):
+        signals += 1
+    if space_ratio(text) < 0.08:
+        signals += 1
+    return signals >= 1
+
+
 # =========================================================
 # 2. Single-column text reconstruction (preserve order)
 # =========================================================
-
-def rebuild_text_from_words(words, x_tolerance=2, y_tolerance=3):
-    if not words:
-        return ""
-
+
+def rebuild_text_from_words(words, x_tolerance=2, y_tolerance=3):
+    if not words:
+        return ""
+
     # Reading order: doctop -> x
-    words = sorted(words, key=lambda w: (w["doctop"], w["x0"]))
-
-    lines = []
-    current_line = []
-    current_y = None
-
-    for w in words:
-        y = w["top"]
-        if current_y is None:
-            current_y = y
-        elif abs(y - current_y) > y_tolerance:
-            lines.append(current_line)
-            current_line = []
-            current_y = y
-        current_line.append(w)
-
-    if current_line:
-        lines.append(current_line)
-
-    text_lines = []
-    for line in lines:
-        line = sorted(line, key=lambda w: w["x0"])
-        parts = []
-        prev_x1 = None
-
-        for w in line:
-            if prev_x1 is not None and (w["x0"] - prev_x1) > x_tolerance:
-                parts.append(" ")
-            parts.append(w["text"])
-            prev_x1 = w["x1"]
-
-        text_lines.append("".join(parts))
-
-    return "\n".join(text_lines)
-
-
+    words = sorted(words, key=lambda w: (w["doctop"], w["x0"]))
+
+    lines = []
+    current_line = []
+    current_y = None
+
+    for w in words:
+        y = w["top"]
+        if current_y is None:
+            current_y = y
+        elif abs(y - current_y) > y_tolerance:
+            lines.append(current_line)
+            current_line = []
+            current_y = y
+        current_line.append(w)
+
+    if current_line:
+        lines.append(current_line)
+
+    text_lines = []
+    for line in lines:
+        line = sorted(line, key=lambda w: w["x0"])
+        parts = []
+        prev_x1 = None
+
+        for w in line:
+            if prev_x1 is not None and (w["x0"] - prev_x1) > x_tolerance:
+                parts.append(" ")
+            parts.append(w["text"])
+            prev_x1 = w["x1"]
+
+        text_lines.append("".join(parts))
+
+    return "\n".join(text_lines)
+
+
 # =========================================================
 # 3. Content-aware dual-column handling (core change)
 # =========================================================
-
-def rebuild_with_columns(words, page_width):
-    """Split words into two columns at page center and rebuild text."""
-    split_x = page_width * 0.5
-
+
+def detect_gutter(words, page_width, bin_width=1.0, min_gap=6.0, valley_ratio=0.25):
+    """Find the column gutter from a histogram of word x-extents.
+
+    Every word adds one to each bin it covers. A gutter is the widest run of
+    bins in the central band of the page whose coverage stays below
+    ``valley_ratio`` times the typical column coverage. Full-width lines
+    (titles, abstracts, wide figures) cross the gutter, so it is a valley
+    rather than a hole.
+
+    Returns (left_edge, right_edge) in page coordinates, or None for a
+    single-column page.
+    """
+    if len(words) < 20 or page_width <= 0:
+        return None
+
+    n_bins = int(np.ceil(page_width / bin_width))
+    x0 = np.fromiter((w["x0"] for w in words), dtype=np.float64, count=len(words))
+    x1 = np.fromiter((w["x1"] for w in words), dtype=np.float64, count=len(words))
+    start = np.clip(np.floor(x0 / bin_width).astype(np.int64), 0, n_bins)
+    stop = np.clip(np.ceil(x1 / bin_width).astype(np.int64), 0, n_bins)
+    keep = stop > start  # drops words entirely off the page
+    if not keep.any():
+        return None
+
+    delta = np.zeros(n_bins + 1, dtype=np.int64)
+    np.add.at(delta, start[keep], 1)
+    np.add.at(delta, stop[keep], -1)
+    coverage = np.cumsum(delta[:-1])
+
+    covered = coverage[coverage > 0]
+    if covered.size == 0:
+        return None
+    threshold = valley_ratio * np.percentile(covered, 75)
+
+    lo, hi = int(n_bins * 0.3), int(n_bins * 0.7)
+    low = coverage[lo:hi] <= threshold
+    if not low.any():
+        return None
+
+    # Longest run of low-coverage bins inside the central band
+    edges = np.diff(np.concatenate(([0], low.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_stops = np.flatnonzero(edges == -1)
+    best = int(np.argmax(run_stops - run_starts))
+    if (run_stops[best] - run_starts[best]) * bin_width < min_gap:
+        return None
+    left_edge = (lo + run_starts[best]) * bin_width
+    right_edge = (lo + run_stops[best]) * bin_width
+
+    # Both columns must carry real text, not a stray margin note
+    left_count = int(np.count_nonzero(x1[keep] <= left_edge))
+    right_count = int(np.count_nonzero(x0[keep] >= right_edge))
+    if min(left_count, right_count) < 0.15 * int(keep.sum()):
+        return None
+    return left_edge, right_edge
+
+
+def _split_rows(words, y_tolerance=3):
+    """Group words into page-wide rows using the rebuild_text_from_words rule."""
+    rows = []
+    current_row = []
+    current_y = None
+    for w in sorted(words, key=lambda w: (w["doctop"], w["x0"])):
+        if current_y is None:
+            current_y = w["top"]
+        elif abs(w["top"] - current_y) > y_tolerance:
+            rows.append(current_row)
+            current_row = []
+            current_y = w["top"]
+        current_row.append(w)
+    if current_row:
+        rows.append(current_row)
+    return rows
+
+
+def rebuild_with_gutter(words, gutter):
+    """Rebuild a two-column page around a detected gutter.
+
+    Rows crossing the gutter (titles, abstracts, wide figures/tables) are kept
+    intact as full-width bands; the column bands between them are read left
+    column first, then right column.
+    """
+    left_edge, right_edge = gutter
+    split_x = (left_edge + right_edge) / 2
+    # Ragged column edges may reach into the gutter; only the middle half of
+    # it is reserved for full-width rows.
+    margin = (right_edge - left_edge) / 4
+    core_left, core_right = left_edge + margin, right_edge - margin
+    bands = []  # (is_full_width, words)
+    for row in _split_rows(words):
+        full = any(w["x0"] < core_right and w["x1"] > core_left for w in row)
+        if bands and bands[-1][0] == full:
+            bands[-1][1].extend(row)
+        else:
+            bands.append((full, list(row)))
+
+    parts = []
+    for full, band in bands:
+        if full:
+            parts.append(rebuild_text_from_words(band))
+            continue
+        left = [w for w in band if w["x0"] < split_x]
+        right = [w for w in band if w["x0"] >= split_x]
+        parts.append(rebuild_text_from_words(left) + "\n\n" + rebuild_text_from_words(right))
+    return "\n\n".join(p for p in parts if p)
+
+
+def rebuild_with_columns(words, page_width):
+    """Rebuild a page the user declared as two-column.
+
+    Uses the detected gutter when there is one, else splits at page center.
+    """
+    gutter = detect_gutter(words, page_width)
+    if gutter is not None:
+        return rebuild_with_gutter(words, gutter)
+
+    split_x = page_width * 0.5
+
     # Dual-column body
-    left = [w for w in words if w["x0"] < split_x]
-    right = [w for w in words if w["x0"] >= split_x]
-
-    left_text = rebuild_text_from_words(left)
-    right_text = rebuild_text_from_words(right)
-
-    return left_text + "\n\n" + right_text
-
-
+    left = [w for w in words if w["x0"] < split_x]
+    right = [w for w in words if w["x0"] >= split_x]
+
+    left_text = rebuild_text_from_words(left)
+    right_text = rebuild_text_from_words(right)
+
+    return left_text + "\n\n" + right_text
+
+
 # =========================================================
-# 4. Main parser
+# 4. Page extraction (serial or sharded across the worker pool)
 # =========================================================
-
-def parse_pdf(path, filename, layout_type="single"):
-    """Parse PDF into text, tables, and images.
-    
-    Args:
-        path: File path to PDF
-        filename: PDF filename
-        layout_type: "single" for single-column or "dual" for two-column layout
-    """
-    base_dir = os.path.dirname(path)
-    basename = os.path.splitext(filename)[0]
-    basename = basename.replace(" ", "_")  # Sanitize for directory name
-    process_dir = os.path.join(base_dir, "process", f"{basename}__pdf")
-    os.makedirs(process_dir, exist_ok=True)
-    texts = []
-    tables_info = []
-    images_info = []
-
-    # -------------------------------
-    # Text
-    # -------------------------------
-    with pdfplumber.open(path) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            raw_text = page.extract_text(
-                x_tolerance=2,
-                y_tolerance=3,
-                use_text_flow=True
-            ) or ""
-
-            # Decide text extraction method based on layout_type
-            if layout_type == "dual":
-                # For dual column: always extract words and rebuild by columns
-                words = page.extract_words(
-                    x_tolerance=2,
-                    y_tolerance=3,
-                    keep_blank_chars=False
-                )
-                text = rebuild_with_columns(words, page.width)
-            else:
-                # For single column: use raw text, but fallback if spaces missing
-                if is_space_missing(raw_text):
-                    words = page.extract_words(
-                        x_tolerance=2,
-                        y_tolerance=3,
-                        keep_blank_chars=False
-                    )
-                    text = rebuild_text_from_words(words)
-                else:
-                    text = raw_text
-
-            texts.append(text)
-
-            with open(
-                os.path.join(process_dir, f"page_{i}.txt"),
-                "w",
-                encoding="utf-8"
-            ) as f:
-                f.write(text)
-
-    # -------------------------------
-    # Images
-    # -------------------------------
-    doc = fitz.open(path)
-    for p_idx in range(len(doc)):
-        page = doc[p_idx]
-        for img_idx, img in enumerate(page.get_images(full=True), start=1):
-            xref = img[0]
-            try:
-                base = doc.extract_image(xref)
-                img_bytes = base["image"]
-                ext = base.get("ext", "png")
-                img_name = f"page_{p_idx+1}_img_{img_idx}.{ext}"
-                img_path = os.path.join(process_dir, img_name)
-
-                with open(img_path, "wb") as f:
-                    f.write(img_bytes)
-
-                images_info.append({
-                    "page": p_idx + 1,
-                    "img_index": img_idx,
-                    "path": img_path,
-                    "width": base.get("width"),
-                    "height": base.get("height")
-                })
-            except Exception:
-                continue
-    doc.close()
-
-    # -------------------------------
-    # Summary
-    # -------------------------------
-    full_text_path = os.path.join(process_dir, "full_text.txt")
-    with open(full_text_path, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(texts))
-
-    summary = {
-        "text_files": [
-            os.path.join(process_dir, f"page_{i}.txt")
-            for i in range(1, len(texts) + 1)
-        ],
-        "full_text": full_text_path,
-        "tables": tables_info,
-        "images": images_info
-    }
-
-    with open(
-        os.path.join(process_dir, "summary.json"),
-        "w",
-        encoding="utf-8"
-    ) as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
-
-    return process_dir, summary
+
+def extract_page_text(page, layout_type="auto"):
+    # Decide text extraction method based on layout_type
+    if layout_type == "dual":
+        # For dual column: always extract words and rebuild by columns
+        words = page.extract_words()
+        return rebuild_with_columns(words, page.width)
+
+    if layout_type == "auto":
+        # Detect the layout per page from the word positions
+        words = page.extract_words()
+        gutter = detect_gutter(words, page.width)
+        if gutter is not None:
+            return rebuild_with_gutter(words, gutter)
+        raw_text = page.extract_text()
+        if is_space_missing(raw_text):
+            return rebuild_text_from_words(words)
+        return raw_text
+
+    # For single column: use raw text, but fallback if spaces missing
+    raw_text = page.extract_text()
+    if is_space_missing(raw_text):
+        words = page.extract_words()
+        return rebuild_text_from_words(words)
+    return raw_text
+
+
+def _extract_page_range(path, engine, layout_type, start, stop):
+    """Worker task: texts for pages [start, stop) of one document."""
+    with open_pdf(path, engine) as doc:
+        return start, [extract_page_text(page, layout_type) for page in doc.pages(start, stop)]
+
+
+def _shard_pages(page_count, shards):
+    size = -(-page_count // shards)  # ceil
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _iter_texts(doc, path, engine, layout_type):
+    page_count = len(doc)
+    if PDF_PARSE_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for page in doc.pages():
+            yield extract_page_text(page, layout_type)
+        return
+
+    pool = get_process_pool()
+    futures = [
+        pool.submit(_extract_page_range, path, engine, layout_type, start, stop)
+        for start, stop in _shard_pages(page_count, PDF_PARSE_WORKERS)
+    ]
+    # Consume shards in page order so output never depends on completion order
+    for future in futures:
+        _, texts = future.result()
+        yield from texts
+
+
+# =========================================================
+# 5. Main parser
+# =========================================================
+
+def iter_pdf_pages(path, filename, layout_type="auto", engine=None):
+    """Parse a PDF and yield progress records as they are produced.
+
+    Records (dicts, discriminated by "type"):
+      - start: {"process_dir", "pages"}
+      - page:  {"page", "pages", "offsets", "text"} (byte offsets in full_text.txt)
+      - image: one image manifest entry (per xref) as stored in summary.json
+      - done:  {"process_dir", "summary"}
+
+    A file that was already parsed with the same options yields only "done",
+    with the stored summary (marked "cached"). A new parse is written to a
+    staging directory and replaces process_dir only once it is complete, so
+    a parse with other options or a concurrent upload never sees half of it.
+
+    Args:
+        path: File path to PDF
+        filename: PDF filename
+        layout_type: "auto" to detect columns per page, "single" for
+            single-column or "dual" for two-column layout
+        engine: extraction engine name ("pymupdf" or "pdfplumber"),
+            defaults to PDF_ENGINE from app.config
+    """
+    process_dir = process_dir_for(path, filename, "pdf")
+    engine = engine or PDF_ENGINE
+    parse_options = {"layout": layout_type, "engine": engine}
+
+    # Uploads are content-addressed, so an existing summary made with the same
+    # options is the parse of this exact file
+    cached = load_cached_parse(process_dir, parse_options)
+    if cached is not None:
+        yield {"type": "done", "process_dir": process_dir, "summary": cached}
+        return
+
+    staging_dir = staging_dir_for(process_dir)
+    full_text_path = os.path.join(process_dir, "full_text.txt")
+    tables_info = []
+    images_info = []
+
+    try:
+        with open_pdf(path, engine) as doc, \
+                PageStoreWriter(os.path.join(staging_dir, "full_text.txt")) as store:
+            page_count = len(doc)
+            yield {"type": "start", "process_dir": process_dir, "pages": page_count}
+
+            # -------------------------------
+            # Text (one blob + page offset index, see app.services.page_store)
+            # -------------------------------
+            for i, text in enumerate(_iter_texts(doc, path, engine, layout_type), start=1):
+                start, end = store.add(text)
+                yield {"type": "page", "page": i, "pages": page_count, "offsets": [start, end], "text": text}
+
+            # -------------------------------
+            # Images
+            # -------------------------------
+            # Metadata only; pixels are decoded on demand by materialize_image()
+            for image in doc.iter_images():
+                images_info.append(image)
+                yield {"type": "image", **image}
+
+        # -------------------------------
+        # Summary (paths as they will be once published)
+        # -------------------------------
+        summary = {
+            "full_text": full_text_path,
+            "page_index": index_path_for(full_text_path),
+            "pages": page_count,
+            "tables": tables_info,
+            "images": images_info,
+            "source": path,
+            "parse_options": parse_options,
+        }
+
+        with open(
+            os.path.join(staging_dir, "summary.json"),
+            "w",
+            encoding="utf-8"
+        ) as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        publish_dir(staging_dir, process_dir)
+    finally:
+        # Failed or abandoned (client gone) parses leave nothing behind
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    yield {"type": "done", "process_dir": process_dir, "summary": summary}
+
+
+def parse_pdf(path, filename, layout_type="auto", engine=None):
+    """Parse PDF into text, tables, and images.
+    
+    Args:
+        path: File path to PDF
+        filename: PDF filename
+        layout_type: "auto" to detect columns per page, "single" for
+            single-column or "dual" for two-column layout
+        engine: extraction engine name ("pymupdf" or "pdfplumber"),
+            defaults to PDF_ENGINE from app.config
+    """
+    for record in iter_pdf_pages(path, filename, layout_type=layout_type, engine=engine):
+        if record["type"] == "done":
+            return record["process_dir"], record["summary"]
+    raise RuntimeError("PDF parser finished without a summary")
+
+
+_summary_locks = {}
+_summary_locks_guard = threading.Lock()
+
+
+def _summary_lock(process_dir):
+    """Lock serializing the summary.json updates of one process directory."""
+    with _summary_locks_guard:
+        return _summary_locks.setdefault(os.path.abspath(process_dir), threading.Lock())
+
+
+def materialize_image(process_dir, xref):
+    """Return a file path holding the pixels of image ``xref``.
+
+    The image is decoded once, stored content-addressed under
+    ``<process_dir>/images/`` and its path recorded in summary.json, so
+    later calls (and checks that share the image) reuse the file. The
+    update holds the directory's lock and replaces summary.json atomically,
+    so concurrent calls neither lose each other's paths nor expose a
+    half-written file.
+
+    This is the pixel accessor for PDF images. Current checks need only
+    the manifest's dimensions (image_quality reads them from the xref
+    table), so nothing in the tree decodes pixels yet.
+    """
+    summary_path = os.path.join(process_dir, "summary.json")
+    with _summary_lock(process_dir):
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+        entry = next((img for img in summary.get("images", []) if img.get("xref") == xref), None)
+        if entry is None:
+            raise KeyError(f"image xref {xref} not in manifest")
+        if entry.get("path") and os.path.exists(entry["path"]):
+            return entry["path"]
+
+        entry["path"] = extract_image_file(summary["source"], xref, os.path.join(process_dir, "images"))
+        fd, tmp_path = tempfile.mkstemp(dir=process_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, summary_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+            raise
+        return entry["path"]
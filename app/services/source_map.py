@@ -0,0 +1,144 @@
+"""Offset -> source location map for merged texts.
+
+A LaTeX parse writes ``full_text.srcmap`` next to ``full_text.txt``:
+a little-endian uint64 entry count n, then three arrays of n entries —
+uint64 character offsets into the merged text (ascending), uint32 file ids
+(indexes into summary["source_files"]) and uint32 1-based line numbers.
+Entry i means the merged text from offsets[i] on is line lines[i] of file
+files[i]. There is one entry per merged line (plus one per spliced
+segment), so a lookup is a single bisect.
+
+PDF parses need no extra file: their page store already maps offsets to
+pages.
+"""
+
+import bisect
+import json
+import os
+import sys
+from array import array
+from typing import Callable, List, Optional, Tuple
+
+from app.services.page_store import PAGE_SEPARATOR, PageStore
+
+
+def srcmap_path_for(full_text_path: str) -> str:
+    return os.path.splitext(full_text_path)[0] + ".srcmap"
+
+
+class SourceMap:
+    """Array-backed (offset -> file id, line) table."""
+
+    def __init__(self):
+        self.offsets = array("Q")
+        self.files = array("I")
+        self.lines = array("I")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: int, file_id: int, line: int) -> None:
+        # A later segment starting at the same offset replaces the earlier one
+        if self.offsets and self.offsets[-1] == offset:
+            self.files[-1] = file_id
+            self.lines[-1] = line
+            return
+        self.offsets.append(offset)
+        self.files.append(file_id)
+        self.lines.append(line)
+
+    def lookup(self, offset: int) -> Optional[Tuple[int, int]]:
+        """(file id, line) of the merged-text character at ``offset``."""
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        if i < 0:
+            return None
+        return self.files[i], self.lines[i]
+
+    def copy_range(self, other: "SourceMap", start: int, end: int, shift: int,
+                   file_ids: Callable[[int], int]) -> None:
+        """Append ``other``'s entries for [start, end), moved by ``shift`` and
+        with file ids translated by ``file_ids``."""
+        found = other.lookup(start)
+        if found is None:
+            return
+        self.add(start + shift, file_ids(found[0]), found[1])
+        lo = bisect.bisect_right(other.offsets, start)
+        hi = bisect.bisect_left(other.offsets, end)
+        for i in range(lo, hi):
+            self.add(other.offsets[i] + shift, file_ids(other.files[i]), other.lines[i])
+
+    def write(self, path: str) -> None:
+        arrays = [array("Q", [len(self)]), self.offsets, self.files, self.lines]
+        with open(path, "wb") as f:
+            for arr in arrays:
+                if sys.byteorder != "little":
+                    arr = array(arr.typecode, arr)
+                    arr.byteswap()
+                arr.tofile(f)
+
+    @classmethod
+    def read(cls, path: str) -> "SourceMap":
+        srcmap = cls()
+        with open(path, "rb") as f:
+            count = array("Q")
+            count.frombytes(f.read(8))
+            if sys.byteorder != "little":
+                count.byteswap()
+            n = count[0]
+            for arr in (srcmap.offsets, srcmap.files, srcmap.lines):
+                arr.frombytes(f.read(n * arr.itemsize))
+                if sys.byteorder != "little":
+                    arr.byteswap()
+        return srcmap
+
+
+class DocumentLocator:
+    """Turns merged-text character offsets into "file.tex:line" or "page N"."""
+
+    def __init__(self, srcmap: Optional[SourceMap] = None, source_files: Optional[List[str]] = None,
+                 page_starts: Optional[List[int]] = None):
+        self._srcmap = srcmap
+        self._source_files = source_files or []
+        self._page_starts = page_starts
+
+    def locate(self, offset: int) -> Optional[str]:
+        if self._srcmap is not None:
+            found = self._srcmap.lookup(offset)
+            if found is None or found[0] >= len(self._source_files):
+                return None
+            return f"{self._source_files[found[0]]}:{found[1]}"
+        if self._page_starts:
+            return f"page {max(1, bisect.bisect_right(self._page_starts, offset))}"
+        return None
+
+    def locate_all(self, offsets) -> List[str]:
+        located = (self.locate(o) for o in offsets)
+        return list(dict.fromkeys(loc for loc in located if loc))
+
+
+def _pdf_page_starts(full_text_path: str) -> List[int]:
+    starts = []
+    pos = 0
+    with PageStore(full_text_path) as store:
+        for number in range(1, len(store) + 1):
+            starts.append(pos)
+            pos += len(store.page(number)) + len(PAGE_SEPARATOR)
+    return starts
+
+
+def load_locator(proj_path: str) -> Optional[DocumentLocator]:
+    """Locator for a process directory, or None when it has no parse."""
+    if not proj_path:
+        return None
+    try:
+        with open(os.path.join(proj_path, "summary.json"), "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        full_text_path = summary["full_text"]
+        if "main_tex" in summary:
+            return DocumentLocator(
+                srcmap=SourceMap.read(srcmap_path_for(full_text_path)),
+                source_files=summary.get("source_files", []),
+            )
+        return DocumentLocator(page_starts=_pdf_page_starts(full_text_path))
+    except Exception:
+        return None
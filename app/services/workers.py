@@ -0,0 +1,191 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, Optional, Tuple
+
+from app.config import CHECK_THREADS, PDF_PARSE_WORKERS
+
+_pool = None
+_check_pool = None
+_pool_lock = threading.Lock()
+_thread_pool = None
+_loop = None
+
+
+def _warm_worker() -> None:
+    """Import the PDF libraries once per worker instead of once per task."""
+    import fitz  # noqa: F401  PyMuPDF
+    import pdfplumber  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    # Never fork: by the time the pool starts, this process runs the asyncio
+    # loop and thread pool threads (and may hold their locks)
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_PARSE_WORKERS,
+                mp_context=_pool_context(),
+                initializer=_warm_worker,
+            )
+        return _pool
+
+
+def get_check_pool() -> ProcessPoolExecutor:
+    """Return the worker pool for CPU-bound checks, creating it on first use.
+
+    Separate from the parsing pool so that recycle_check_pool can kill a
+    runaway check without taking an upload's parse down with it.
+    """
+    global _check_pool
+    with _pool_lock:
+        if _check_pool is None:
+            _check_pool = ProcessPoolExecutor(
+                max_workers=PDF_PARSE_WORKERS,
+                mp_context=_pool_context(),
+                initializer=_warm_worker,
+            )
+        return _check_pool
+
+
+def _terminate(processes: list) -> None:
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def recycle_check_pool(grace: float) -> None:
+    """Retire the check pool after a check in it timed out.
+
+    Checks submitted from now on get a fresh pool. The old pool takes no
+    new work, and its workers are terminated after ``grace`` seconds,
+    which gives the other checks already in it time to finish.
+    """
+    global _check_pool
+    with _pool_lock:
+        pool, _check_pool = _check_pool, None
+    if pool is None:
+        return
+    # shutdown() forgets the worker processes, so take them first
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False)
+    reaper = threading.Timer(grace, _terminate, args=(processes,))
+    reaper.daemon = True
+    reaper.start()
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Return the process-wide thread pool for I/O-bound work (checks, LLM calls)."""
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=CHECK_THREADS, thread_name_prefix="check")
+        return _thread_pool
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide asyncio loop, running in a daemon thread."""
+    global _loop
+    with _pool_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-io", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def submit_coroutine(coro: Coroutine) -> Future:
+    """Schedule ``coro`` on the background loop; cancelling the returned
+    future cancels the task."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+async def run_blocking(func: Callable, *args: Any) -> Any:
+    """Await ``func(*args)`` run on the thread pool, so CPU or disk work
+    inside a coroutine does not stall every other task on the shared loop."""
+    return await asyncio.get_running_loop().run_in_executor(get_thread_pool(), func, *args)
+
+
+def iterate_async(aiterator: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+    """Consume an async iterator from a plain thread.
+
+    The iterator runs on the background loop and hands items over through a
+    queue. Raises TimeoutError once ``timeout`` seconds have passed in total;
+    stopping early (timeout, error, or the caller closing the generator)
+    cancels the iterator.
+    """
+    items: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+
+    async def pump() -> None:
+        try:
+            async for item in aiterator:
+                items.put(("item", item))
+            items.put(("done", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            items.put(("error", e))
+
+    future = submit_coroutine(pump())
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                kind, value = items.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"no result within {timeout:g}s") from None
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        future.cancel()
+
+
+def warm_process_pool() -> None:
+    """Start every worker now so the first large upload does not pay for it."""
+    pool = get_process_pool()
+    for future in [pool.submit(_ping) for _ in range(PDF_PARSE_WORKERS)]:
+        future.result()
+
+
+def shutdown_process_pool() -> None:
+    global _pool, _check_pool, _thread_pool, _loop
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _check_pool is not None:
+            _check_pool.shutdown(wait=False, cancel_futures=True)
+            _check_pool = None
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=False, cancel_futures=True)
+            _thread_pool = None
+        if _loop is not None:
+            _loop.call_soon_threadsafe(_loop.stop)
+            _loop = None
+
+
+atexit.register(shutdown_process_pool)